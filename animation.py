@@ -0,0 +1,112 @@
+import pygame
+
+from asset_cache import assets
+
+
+# `count` frames of frame_size laid out left to right, then top to bottom, in the image
+# at path. Without a frame_size the whole image is a single frame.
+def sheet(path, frame_size=None, count=None):
+    return (path, frame_size, count)
+
+
+def _slice(spec):
+    path, frame_size, count = spec
+    image = assets.image(path)
+    if frame_size is None:
+        return [image]
+    width, height = frame_size
+    columns = image.get_width() // width
+    if count is None:
+        count = columns * (image.get_height() // height)
+    return [image.subsurface((i % columns * width, i // columns * height, width, height)) for i in range(count)]
+
+
+# All frames of a set of sheets copied into one display-format surface, packed in
+# rows; each frame is a subsurface of it.
+class Atlas:
+    def __init__(self, sheets, max_width=2048, padding=1):
+        specs = list(dict.fromkeys(sheets))
+        sources = {spec: _slice(spec) for spec in specs}
+
+        placed = []
+        x = y = row_height = width = 0
+        for spec in specs:
+            for frame in sources[spec]:
+                w, h = frame.get_size()
+                if x and x + w > max_width:
+                    x = 0
+                    y += row_height + padding
+                    row_height = 0
+                placed.append((spec, frame, (x, y, w, h)))
+                x += w + padding
+                row_height = max(row_height, h)
+                width = max(width, x)
+
+        self.surface = pygame.Surface((max(width, 1), y + row_height), pygame.SRCALPHA).convert_alpha()
+        self.frames = {spec: [] for spec in specs}
+        for spec, frame, rect in placed:
+            self.surface.blit(frame, rect[:2], special_flags=pygame.BLEND_RGBA_MAX)
+            self.frames[spec].append(self.surface.subsurface(rect))
+
+
+_atlases = {}
+
+
+def atlas(sheets):
+    key = tuple(dict.fromkeys(sheets))
+    cached = _atlases.get(key)
+    if cached is None:
+        cached = Atlas(key)
+        _atlases[key] = cached
+    return cached
+
+
+class Animation:
+    __slots__ = ("frames", "frame_time", "loop")
+
+    def __init__(self, frames, fps=6, loop=True):
+        self.frames = frames
+        self.frame_time = 1 / fps
+        self.loop = loop
+
+    def frame(self, t):
+        i = int(t / self.frame_time)
+        if self.loop:
+            i %= len(self.frames)
+        elif i >= len(self.frames):
+            i = len(self.frames) - 1
+        return self.frames[i]
+
+
+# {state: sheet} -> {state: Animation} over a shared atlas, built once per sheet set.
+def animations(sheets, fps=6):
+    frames = atlas(sheets.values()).frames
+    return {state: Animation(frames[spec], fps) for state, spec in sheets.items()}
+
+
+# The state rules all three players share, advanced by simulation time so animation
+# speed no longer depends on the frame rate. Changing state restarts its animation.
+class PlayerAnimator:
+    def __init__(self, animations, state="idle"):
+        self.animations = animations
+        self.state = state
+        self.time = 0.0
+
+    def update(self, player, keys, dt):
+        if player.jetpack_enabled and player.is_flying:
+            state = "fly"
+        elif not player.grounded:
+            state = "jump"
+        else:
+            state = "run" if keys[pygame.K_RIGHT] else "idle"
+
+        if state != self.state:
+            self.state = state
+            self.time = 0.0
+        else:
+            self.time += dt
+        return self.image
+
+    @property
+    def image(self):
+        return self.animations[self.state].frame(self.time)
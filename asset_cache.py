@@ -0,0 +1,147 @@
+import os
+
+import pygame
+
+from asset_pack import AssetPack
+
+
+def image_key(path, size=None, flip_x=False, flip_y=False, alpha=True):
+    return (path, size, flip_x, flip_y, alpha)
+
+
+class AssetCache:
+    def __init__(self):
+        self.sources = {}
+        self.surfaces = {}
+        self.sounds = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.packed = 0
+        self.pack = None
+        self.pack_path = None
+
+    # Serves images from a pack baked by asset_pack.py when one exists; ASSET_PACK=0
+    # turns this off. Needs the display mode set, like any converted image. The path
+    # is kept either way, as where asset_pack.py bakes the game's pack.
+    def use_pack(self, path):
+        self.pack_path = path
+        if os.environ.get("ASSET_PACK") == "0" or not os.path.exists(path):
+            return False
+        self.pack = AssetPack(path)
+        return True
+
+    def _source(self, path, alpha):
+        key = (path, alpha)
+        surface = self.sources.get(key)
+        if surface is None:
+            raw = pygame.image.load(path)
+            self.loads += 1
+            surface = raw.convert_alpha() if alpha else raw.convert()
+            self.sources[key] = surface
+        return surface
+
+    # Shared, display-converted surface for path scaled to size and flipped.
+    # Callers must treat the result as read-only since every caller gets the same object.
+    def image(self, path, size=None, flip_x=False, flip_y=False, alpha=True):
+        key = image_key(path, size, flip_x, flip_y, alpha)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        if self.pack is not None:
+            surface = self.pack.surface(key)
+            if surface is not None:
+                self.packed += 1
+                self.surfaces[key] = surface
+                return surface
+
+        surface = self._source(path, alpha)
+        if flip_x or flip_y:
+            surface = pygame.transform.flip(surface, flip_x, flip_y)
+        if size is not None:
+            surface = pygame.transform.scale(surface, size)
+        self.surfaces[key] = surface
+        return surface
+
+    # The image if it is already cached, without loading it.
+    def loaded(self, path, size=None, flip_x=False, flip_y=False, alpha=True):
+        return self.surfaces.get(image_key(path, size, flip_x, flip_y, alpha))
+
+    # The image for key as an unconverted surface, from the pack or decoded, flipped
+    # and scaled. It never touches the display, so it is safe on a loader thread; the
+    # result goes back through adopt() on the main thread.
+    def decode(self, key):
+        if self.pack is not None:
+            surface = self.pack.raw(key)
+            if surface is not None:
+                return surface
+        path, size, flip_x, flip_y, alpha = key
+        surface = pygame.image.load(path)
+        if flip_x or flip_y:
+            surface = pygame.transform.flip(surface, flip_x, flip_y)
+        if size is not None:
+            surface = pygame.transform.scale(surface, size)
+        return surface
+
+    def adopt(self, key, surface):
+        if key not in self.surfaces:
+            self.loads += 1
+            self.surfaces[key] = surface.convert_alpha() if key[4] else surface.convert()
+        return self.surfaces[key]
+
+    def sound(self, path):
+        sound = self.sounds.get(path)
+        if sound is None:
+            sound = pygame.mixer.Sound(path)
+            self.sounds[path] = sound
+        return sound
+
+    def adopt_sound(self, path, sound):
+        return self.sounds.setdefault(path, sound)
+
+    def solid(self, size, color):
+        key = ("solid", size, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = pygame.Surface(size).convert()
+        surface.fill(color)
+        self.surfaces[key] = surface
+        return surface
+
+    def preload(self, specs):
+        for spec in specs:
+            if isinstance(spec, str):
+                self.image(spec)
+            else:
+                self.image(*spec)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "packed": self.packed,
+            "surfaces": len(self.surfaces),
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.packed = 0
+
+    def clear(self):
+        self.sources.clear()
+        self.surfaces.clear()
+        self.sounds.clear()
+        self.reset_stats()
+
+
+assets = AssetCache()
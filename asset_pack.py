@@ -0,0 +1,259 @@
+import time
+
+# Taken before anything else is imported, for time-to-first-frame.
+_started = time.perf_counter()
+
+import argparse
+import json
+import mmap
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import zlib
+
+import pygame
+
+MAGIC = b"HPAK"
+VERSION = 3
+HEADER = struct.Struct("<4sII")
+ALIGN = 64
+FORMAT = "BGRA"
+
+# The scenes whose assets go into each game's pack, and the one timed for first frame.
+GAME_SCENES = {
+    "main": ("main.main_menu", "main.options", "main.play"),
+    "makeshift2": ("makeshift2.main",),
+    "jurassic": ("jurassic.main",),
+}
+
+
+def _key(path, size, flip_x, flip_y, alpha):
+    return (path, tuple(size) if size is not None else None, bool(flip_x), bool(flip_y), bool(alpha))
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+# Writes already scaled, flipped and converted surfaces keyed like AssetCache.image()
+# as BGRA pixels, the layout of a typical 32-bit display surface. Stored raw, they map
+# straight into surfaces with no decoding at all, but the pack comes out several times
+# larger than the PNGs it came from. A zlib level compresses each entry instead, to
+# about the PNGs' size, and loading one back is then an inflate and a copy; `measure`
+# reports what the inflating costs.
+def bake(surfaces, out_path, level=None):
+    entries = []
+    blobs = []
+    offset = 0
+    for key, surface in surfaces.items():
+        path, size, flip_x, flip_y, alpha = key
+        width, height = surface.get_size()
+        blob = pygame.image.tobytes(surface, FORMAT)
+        if level is not None:
+            blob = zlib.compress(blob, level)
+        entries.append({
+            "key": [path, size, flip_x, flip_y, alpha],
+            "size": [width, height],
+            "offset": offset,
+            "length": len(blob),
+            "compressed": level is not None,
+            "source": _source_stamp(path),
+        })
+        blobs.append(blob)
+        offset += len(blob) + (-len(blob)) % ALIGN
+
+    index = json.dumps(entries).encode()
+    data_start = HEADER.size + len(index)
+    data_start += (-data_start) % ALIGN
+    with open(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index)))
+        f.write(index)
+        f.write(bytes(data_start - f.tell()))
+        for blob in blobs:
+            f.write(blob)
+            f.write(bytes((-len(blob)) % ALIGN))
+    for entry in entries:
+        entry["offset"] += data_start
+    return entries
+
+
+class AssetPack:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} asset pack")
+        entries = json.loads(self.data[HEADER.size:HEADER.size + index_length])
+        data_start = HEADER.size + index_length
+        data_start += (-data_start) % ALIGN
+        self.entries = {}
+        for entry in entries:
+            entry["offset"] += data_start
+            self.entries[_key(*entry["key"])] = entry
+        self.view = memoryview(self.data)
+
+    # An unconverted surface for the AssetCache key, inflated from the mapped file or,
+    # for a raw entry, pointing straight into it. None when the pack does not have it
+    # or the source image changed since the pack was baked. It needs no display, so
+    # loader threads can call it.
+    def raw(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        try:
+            if _source_stamp(entry["key"][0]) != entry["source"]:
+                return None
+        except OSError:
+            pass
+        offset = entry["offset"]
+        pixels = self.view[offset:offset + entry["length"]]
+        if entry["compressed"]:
+            pixels = zlib.decompress(pixels)
+        return pygame.image.frombuffer(pixels, tuple(entry["size"]), FORMAT)
+
+    def surface(self, key):
+        raw = self.raw(key)
+        if raw is None:
+            return None
+        return raw.convert_alpha() if key[4] else raw.convert()
+
+    def close(self):
+        if getattr(self, "view", None) is not None:
+            self.view.release()
+            self.view = None
+        self.data.close()
+        self.file.close()
+
+
+# Bakes the images a game's scenes load into the pack its use_pack() call names.
+# Running the scenes picks up what they load themselves; the game's GAME_IMAGES and
+# anything the loader threads were still decoding are waited for, so what goes in
+# doesn't depend on how far the loader got within those frames.
+def bake_game(name, frames=5, level=None):
+    import bench
+    import headless
+    from asset_cache import assets
+
+    assets.clear()
+    try:
+        for scene in GAME_SCENES[name]:
+            bench.run_scene(scene, frames)
+        game = headless.load_game(name)
+        game.loader.load(game.GAME_IMAGES)
+        game.loader.wait()
+        surfaces = {key: surface for key, surface in assets.surfaces.items() if key[0] != "solid"}
+        entries = bake(surfaces, assets.pack_path, level)
+    finally:
+        assets.clear()
+    size = os.path.getsize(assets.pack_path)
+    sources = sum(os.path.getsize(path) for path in {entry["key"][0] for entry in entries})
+    print(f"{name}: {len(entries)} images, {size / 1e6:.1f} MB from {sources / 1e6:.1f} MB of sources "
+          f"-> {os.path.abspath(assets.pack_path)}")
+
+
+def first_frame(scene):
+    import bench
+
+    bench.run_scene(scene, 1)
+    return time.perf_counter() - _started
+
+
+# What reading every image out of a game's pack costs, and how much of it is inflating.
+def pack_cost(name):
+    import headless
+    from asset_cache import assets
+
+    headless.load_game(name)
+    if not os.path.exists(assets.pack_path):
+        return None
+    pack = AssetPack(assets.pack_path)
+    try:
+        inflate = 0.0
+        start = time.perf_counter()
+        for entry in pack.entries.values():
+            offset = entry["offset"]
+            pixels = pack.view[offset:offset + entry["length"]]
+            if entry["compressed"]:
+                begin = time.perf_counter()
+                pixels = zlib.decompress(pixels)
+                inflate += time.perf_counter() - begin
+            pygame.image.frombuffer(pixels, tuple(entry["size"]), FORMAT)
+            # A raw entry's surface and slice point into the mapping, which can't close under them.
+            pixels = None
+        total = time.perf_counter() - start
+        raw_size = sum(width * height * 4 for width, height in (entry["size"] for entry in pack.entries.values()))
+        return {"images": len(pack.entries), "size": os.path.getsize(pack.path), "raw_size": raw_size,
+                "inflate": inflate, "read": total}
+    finally:
+        pack.close()
+
+
+# Time from process start to the first presented frame, each in a fresh interpreter
+# so no decoded image is cached, with and without the pack.
+def measure(name, repeat=5):
+    scene = GAME_SCENES[name][0]
+    results = {}
+    for label, use_pack in (("png", "0"), ("pack", "1")):
+        env = dict(os.environ, ASSET_PACK=use_pack)
+        times = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "first-frame", scene],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            times.append(float(output.split()[-1]))
+        results[label] = statistics.median(times)
+    print(f"{name}: time to first frame {results['png'] * 1000:.0f} ms decoding PNGs, "
+          f"{results['pack'] * 1000:.0f} ms from the pack ({results['png'] / results['pack']:.1f}x)")
+    cost = pack_cost(name)
+    if cost is not None:
+        print(f"{name}: reading the pack's {cost['images']} images takes {cost['read'] * 1000:.1f} ms, "
+              f"{cost['inflate'] * 1000:.1f} ms of it inflating; {cost['size'] / 1e6:.1f} MB on disk, "
+              f"{cost['raw_size'] / 1e6:.1f} MB stored raw")
+    results["cost"] = cost
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bake images into memory-mapped pixel packs and time cold starts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bake_parser = commands.add_parser("bake", help="write each game's asset pack")
+    bake_parser.add_argument("--game", action="append", choices=sorted(GAME_SCENES))
+    bake_parser.add_argument("--compress", action="store_true",
+                             help="zlib-compress each image: about 3x smaller, inflated on every load")
+    measure_parser = commands.add_parser("measure", help="compare time to first frame with and without the pack")
+    measure_parser.add_argument("--game", action="append", choices=sorted(GAME_SCENES))
+    measure_parser.add_argument("--repeat", type=int, default=5)
+    first_parser = commands.add_parser("first-frame")
+    first_parser.add_argument("scene")
+    args = parser.parse_args(argv)
+
+    if args.command == "first-frame":
+        print(f"{first_frame(args.scene):.6f}")
+    elif args.command == "bake":
+        os.environ["ASSET_PACK"] = "0"
+        baked = []
+        skipped = []
+        for name in args.game or GAME_SCENES:
+            # A game that can't load its files is skipped; the others still get packs.
+            try:
+                bake_game(name, level=6 if args.compress else None)
+            except (OSError, pygame.error) as e:
+                print(f"{name}: skipped, {e}")
+                skipped.append(name)
+            else:
+                baked.append(name)
+        print(f"baked: {', '.join(baked) or 'none'}; skipped: {', '.join(skipped) or 'none'}")
+        return 1 if skipped else 0
+    else:
+        for name in args.game or GAME_SCENES:
+            measure(name, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
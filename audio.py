@@ -0,0 +1,95 @@
+import os
+
+import pygame
+
+from asset_cache import assets
+
+
+# Owns everything the mixer plays. Music streams from disk through pygame.mixer.music,
+# so a track costs a small decode buffer rather than its whole length in memory;
+# switching tracks fades the current one out and the next one in, and asking for the
+# track that is already on is free. Effects are decoded on the loader threads and get
+# their own reserved channels, used round-robin; one that isn't in yet is skipped
+# rather than decoded on the spot. Every call returns immediately. Without a working
+# mixer (no audio device) it does nothing, and a file that isn't there is reported
+# once and skipped.
+class AudioManager:
+    def __init__(self, loader, music_volume=0.5, effect_channels=4, fade_ms=800, cache=assets):
+        self.loader = loader
+        self.cache = cache
+        self.music_volume = music_volume
+        self.fade_ms = fade_ms
+        self.effects = {}
+        self.music = None
+        self.playing = None
+        self.next_effect = 0
+        self.missing = set()
+
+        if not pygame.mixer.get_init():
+            try:
+                pygame.mixer.init()
+            except pygame.error:
+                self.enabled = False
+                return
+        self.enabled = True
+        if pygame.mixer.get_num_channels() < effect_channels:
+            pygame.mixer.set_num_channels(effect_channels)
+        pygame.mixer.set_reserved(effect_channels)
+        self.effect_channels = [pygame.mixer.Channel(i) for i in range(effect_channels)]
+
+    def _exists(self, path):
+        if path in self.missing:
+            return False
+        if not os.path.exists(path):
+            print(f"audio: {path} not found, playing without it")
+            self.missing.add(path)
+            return False
+        return True
+
+    # Queues the effects for decoding; music needs nothing ahead of time, but missing
+    # tracks are reported here rather than when they are asked for.
+    def preload(self, music=(), effects=()):
+        for path in music:
+            self._exists(path)
+        if self.enabled:
+            self.loader.load(sounds=[path for path, _ in effects if self._exists(path)])
+        for path, volume in effects:
+            self.effects[path] = volume
+
+    # Switches the music to path, fading out whatever is playing first.
+    def play_music(self, path):
+        if path == self.music or not self.enabled or not self._exists(path):
+            return
+        self.music = path
+        if self.playing is not None:
+            pygame.mixer.music.fadeout(self.fade_ms)
+        self.update()
+
+    def play_effect(self, path):
+        if not self.enabled or not self._exists(path):
+            return
+        sound = self.cache.sounds.get(path)
+        if sound is None:
+            self.loader.load(sounds=[path])
+            return
+        channel = self.effect_channels[self.next_effect]
+        self.next_effect = (self.next_effect + 1) % len(self.effect_channels)
+        channel.play(sound)
+        channel.set_volume(self.effects.get(path, 1.0))
+
+    def set_music_volume(self, volume):
+        self.music_volume = volume
+        if self.enabled:
+            pygame.mixer.music.set_volume(volume)
+
+    # Called once a frame: adopts effects that finished decoding and starts the next
+    # track once the previous one has faded out.
+    def update(self):
+        if not self.enabled:
+            return
+        self.loader.poll()
+        if self.music != self.playing and not pygame.mixer.music.get_busy():
+            pygame.mixer.music.load(self.music)
+            pygame.mixer.music.set_volume(self.music_volume)
+            pygame.mixer.music.play(loops=-1, fade_ms=self.fade_ms)
+            self.playing = self.music
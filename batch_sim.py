@@ -0,0 +1,255 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pygame
+
+import headless
+from collision import SweepCollider
+from controls import Keys, RandomInput
+from spawns import spawn_events, spawn_ticks
+
+
+# pygame.Rect rounds float coordinates half away from zero.
+def _rect_round(values):
+    return np.copysign(np.floor(np.abs(values) + 0.5), values).astype(np.int64)
+
+
+# Struct-of-arrays version of RunnerSim for the single-obstacle runner (main.py and
+# makeshift2): N independent games advance together in one vectorized step. The
+# per-game constants are read off a real Player and Obstacle so the two stay in sync.
+# Collisions are bounding-box only, like RunnerSim with pixel_perfect=False.
+class BatchSim:
+    def __init__(self, n, player, obstacle, pattern, height,
+                 seeds=None, seed=None, obstacle_speed=5, jetpack_duration=300, slots=None):
+        if len({kind for kinds in pattern.cycle for kind in kinds}) != 1:
+            raise ValueError("BatchSim only models patterns with a single obstacle kind")
+        self.n = n
+        self.pattern = pattern
+        self.obstacle_speed = obstacle_speed
+        self.jetpack_duration = jetpack_duration
+
+        self.player_x = player.rect.x
+        self.player_w, self.player_h = player.rect.size
+        self.gravity = player.gravity
+        self.jump_strength = player.jump_strength
+        self.double_jump = player.double_jump
+        self.ground_y = height - 20 - self.player_h
+        self.obstacle_w, self.obstacle_h = obstacle.rect.size
+        self.obstacle_y = obstacle.rect.y
+
+        self.y = np.full(n, player.rect.y, np.int64)
+        self.velocity_y = np.full(n, float(player.velocity_y))
+        self.grounded = np.full(n, player.grounded)
+        self.used_double_jump = np.full(n, player.used_double_jump)
+        self.jetpack_enabled = np.zeros(n, bool)
+        self.jetpack_timer = np.zeros(n, np.int64)
+        self.is_flying = np.zeros(n, bool)
+        self.health = np.full(n, player.health, np.int64)
+        self.score = np.zeros(n, np.int64)
+        self.over = np.zeros(n, bool)
+
+        # Obstacles all scroll at the same speed, so they die in spawn order and a
+        # small ring of slots per game is enough.
+        if slots is None:
+            lifetime = (pattern.spawn_x + pattern.jitter + self.obstacle_w) // obstacle_speed + 1
+            slots = lifetime // pattern.min_period + 2
+        self.slots = slots
+        self.obstacle_x = np.zeros((n, slots), np.int64)
+        self.obstacle_alive = np.zeros((n, slots), bool)
+        self.spawned = np.zeros(n, np.int64)
+
+        # The spawn ticks are the same for every game. With seeds, each game draws its
+        # positions from the same stream RunnerSim would; without, a single NumPy
+        # generator is used, which is faster but not comparable.
+        self.tick = 0
+        self.spawn_ticks = spawn_ticks(pattern)
+        self.next_spawn = next(self.spawn_ticks)
+        self.streams = [spawn_events(s, pattern) for s in seeds] if seeds is not None else None
+        self.np_rng = np.random.default_rng(seed)
+
+    def _positions(self, runs):
+        if self.streams is None:
+            return self.pattern.spawn_x + self.np_rng.integers(0, self.pattern.jitter + 1, len(runs))
+        return np.array([next(self.streams[i]).x for i in runs], np.int64)
+
+    def step(self, space, jetpack):
+        active = ~self.over
+
+        # Player.update
+        activate = active & jetpack & ~self.jetpack_enabled
+        self.jetpack_enabled |= activate
+        self.jetpack_timer[activate] = self.jetpack_duration
+
+        self.is_flying = active & self.jetpack_enabled & space
+        self.velocity_y[self.is_flying] = -5.0
+
+        jump = active & ~self.jetpack_enabled & space
+        ground_jump = jump & self.grounded
+        air_jump = jump & ~self.grounded & self.double_jump & ~self.used_double_jump
+        self.velocity_y[ground_jump] = self.jump_strength
+        self.grounded[ground_jump] = False
+        self.used_double_jump[ground_jump] = False
+        self.velocity_y[air_jump] = self.jump_strength
+        self.used_double_jump[air_jump] = True
+
+        self.velocity_y[active] += self.gravity
+        self.y[active] = _rect_round(self.y[active] + self.velocity_y[active])
+
+        landed = active & (self.y >= self.ground_y)
+        self.y[landed] = self.ground_y
+        self.velocity_y[landed] = 0.0
+        self.grounded[landed] = True
+        self.used_double_jump[landed] = False
+
+        ceiling = active & (self.y <= 0)
+        self.y[ceiling] = 0
+        self.velocity_y[ceiling] = 0.0
+
+        ticking = active & self.jetpack_enabled
+        self.jetpack_timer[ticking] -= 1
+        self.jetpack_enabled[ticking & (self.jetpack_timer <= 0)] = False
+
+        # Obstacle.update
+        moving = self.obstacle_alive & active[:, None]
+        self.obstacle_x -= self.obstacle_speed * moving
+        self.obstacle_alive &= ~(moving & (self.obstacle_x + self.obstacle_w < 0))
+
+        # Spawning
+        self.tick += 1
+        if self.tick == self.next_spawn:
+            runs = np.nonzero(active)[0]
+            slot = self.spawned[runs] % self.slots
+            self.obstacle_x[runs, slot] = self._positions(runs)
+            self.obstacle_alive[runs, slot] = True
+            self.spawned[runs] += 1
+            self.next_spawn = next(self.spawn_ticks)
+
+        # Collisions, same strict overlap test as Rect.colliderect
+        y = self.y[:, None]
+        overlap = (
+            self.obstacle_alive
+            & (self.player_x < self.obstacle_x + self.obstacle_w)
+            & (self.player_x + self.player_w > self.obstacle_x)
+            & (y < self.obstacle_y + self.obstacle_h)
+            & (y + self.player_h > self.obstacle_y)
+        )
+        hit = active & overlap.any(axis=1)
+        self.health[hit] -= 1
+        self.obstacle_alive[hit] = False
+        self.over |= hit & (self.health <= 0)
+
+        self.score[active] += 1
+        return hit
+
+    def state(self, i):
+        return {
+            "y": int(self.y[i]),
+            "velocity_y": float(self.velocity_y[i]),
+            "grounded": bool(self.grounded[i]),
+            "used_double_jump": bool(self.used_double_jump[i]),
+            "jetpack_enabled": bool(self.jetpack_enabled[i]),
+            "jetpack_timer": int(self.jetpack_timer[i]),
+            "health": int(self.health[i]),
+            "score": int(self.score[i]),
+            "obstacles": sorted(int(x) for x in self.obstacle_x[i][self.obstacle_alive[i]]),
+        }
+
+
+def scalar_state(run):
+    player = run.player
+    return {
+        "y": player.rect.y,
+        "velocity_y": float(player.velocity_y),
+        "grounded": player.grounded,
+        "used_double_jump": player.used_double_jump,
+        "jetpack_enabled": player.jetpack_enabled,
+        "jetpack_timer": player.jetpack_timer,
+        "health": player.health,
+        "score": run.score,
+        "obstacles": sorted(obstacle.rect.x for obstacle in run.obstacles),
+    }
+
+
+def from_game(game, n, **kwargs):
+    return BatchSim(n, game.Player(), game.Obstacle(0), game.PATTERN, game.HEIGHT, **kwargs)
+
+
+# Steps scalar RunnerSims and a BatchSim side by side on the same seeds and inputs
+# and returns the first (tick, run) where their state differs, or None.
+def check_parity(game, n, ticks, seed=0, jump=0.05, jetpack=0.01):
+    seeds = [seed + i for i in range(n)]
+    runs = [game.new_run(s, SweepCollider(pixel_perfect=False)) for s in seeds]
+    inputs = [RandomInput(s, jump=jump, jetpack=jetpack) for s in seeds]
+    batch = from_game(game, n, seeds=seeds)
+
+    for tick in range(ticks):
+        keys = [source.read() for source in inputs]
+        space = np.array([k[pygame.K_SPACE] for k in keys])
+        jetpack_keys = np.array([k[pygame.K_j] for k in keys])
+        for run, k in zip(runs, keys):
+            if not run.over:
+                run.step(k)
+        batch.step(space, jetpack_keys)
+
+        for i, run in enumerate(runs):
+            if scalar_state(run) != batch.state(i):
+                return tick, i, scalar_state(run), batch.state(i)
+        if batch.over.all():
+            break
+    return None
+
+
+def benchmark(game, n, ticks, seed=0, jump=0.05, jetpack=0.01):
+    rng = np.random.default_rng(seed)
+    space = rng.random((ticks, n)) < jump
+    jetpack_keys = rng.random((ticks, n)) < jetpack
+    key_states = [[Keys(
+        ([pygame.K_SPACE] if space[t, i] else []) + ([pygame.K_j] if jetpack_keys[t, i] else []))
+        for i in range(n)] for t in range(ticks)]
+
+    runs = [game.new_run(seed + i, SweepCollider(pixel_perfect=False)) for i in range(n)]
+    start = time.perf_counter()
+    for t in range(ticks):
+        for run, keys in zip(runs, key_states[t]):
+            if not run.over:
+                run.step(keys)
+    scalar = time.perf_counter() - start
+
+    batch = from_game(game, n, seed=seed)
+    start = time.perf_counter()
+    for t in range(ticks):
+        batch.step(space[t], jetpack_keys[t])
+    vectorized = time.perf_counter() - start
+    return scalar, vectorized
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and benchmark the vectorized batch simulator.")
+    parser.add_argument("--game", choices=("main", "makeshift2"), default="makeshift2")
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--parity-runs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    game = headless.load_game(args.game)
+
+    mismatch = check_parity(game, args.parity_runs, args.ticks, args.seed)
+    if mismatch is not None:
+        tick, run, scalar, vectorized = mismatch
+        print(f"parity FAILED at tick {tick} run {run}:\n  scalar  {scalar}\n  batched {vectorized}")
+        return 1
+    print(f"parity ok: {args.parity_runs} runs x {args.ticks} ticks match RunnerSim exactly")
+
+    scalar, vectorized = benchmark(game, args.runs, args.ticks, args.seed)
+    game_ticks = args.runs * args.ticks
+    print(f"per-object loop: {scalar * 1000:.1f} ms ({game_ticks / scalar / 1000:.0f} game-ticks/ms)")
+    print(f"vectorized:      {vectorized * 1000:.1f} ms ({game_ticks / vectorized / 1000:.0f} game-ticks/ms)")
+    print(f"speedup: {scalar / vectorized:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
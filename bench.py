@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ["DISPLAY_FPS"] = "0"
+# Frame times are only comparable at a fixed quality.
+os.environ["QUALITY"] = "fixed"
+os.environ["SCORES_DB"] = "off"
+
+import pygame
+
+import controls
+import headless
+from controls import ScriptedInput, ScriptedPointer
+from profiler import PHASES, CaptureDone, profiler
+from timestep import FixedTimestep
+
+# (game, function, scene name the loop reports to the profiler)
+SCENES = {
+    "main.play": ("main", "play", "play"),
+    "main.main_menu": ("main", "main_menu", "main_menu"),
+    "main.options": ("main", "options", "options"),
+    "makeshift2.main": ("makeshift2", "main", "makeshift2"),
+    "jurassic.main": ("jurassic", "main", "jurassic"),
+}
+GAMEPLAY = {"play", "main"}
+
+
+# Holds RIGHT throughout, taps SPACE every 40 ticks and uses the jetpack once,
+# holding SPACE to fly for a second.
+def gameplay_script(length=1200):
+    frames = []
+    for tick in range(length):
+        keys = [pygame.K_RIGHT]
+        if tick % 40 == 0 or 610 <= tick < 670:
+            keys.append(pygame.K_SPACE)
+        if tick == 600:
+            keys.append(pygame.K_j)
+        frames.append(keys)
+    return ScriptedInput(frames, loop=True)
+
+
+# Hovers each menu button in turn, then the empty space around them.
+def menu_script(hold=30):
+    spots = [(640, 250), (640, 400), (640, 550), (640, 500), (100, 100)]
+    return ScriptedPointer([spot for spot in spots for _ in range(hold)])
+
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(frames):
+    totals = sorted(total * 1000 for _, total, _ in frames)
+    return {
+        "frames": len(totals),
+        "mean_ms": statistics.fmean(totals),
+        "p50_ms": percentile(totals, 50),
+        "p95_ms": percentile(totals, 95),
+        "p99_ms": percentile(totals, 99),
+        "max_ms": totals[-1],
+        "phases_ms": {phase: statistics.fmean(phases[phase] * 1000 for _, _, phases in frames)
+                      for phase in PHASES},
+    }
+
+
+# Runs one loop until `frames` frames were captured. A gameplay loop that ends
+# early (the player died) is simply started again with the next seed.
+def run_scene(name, frames, seed=0):
+    game_name, function, scene = SCENES[name]
+    game = headless.load_game(game_name)
+    controls.override(keys=gameplay_script(), pointer=menu_script())
+    profiler.captured = []
+    attempt = 0
+    try:
+        while len(profiler.captured) < frames:
+            profiler.capture(scene, frames - len(profiler.captured))
+            loop = getattr(game, function)
+            try:
+                if function in GAMEPLAY:
+                    loop(seed + attempt)
+                else:
+                    loop()
+            except CaptureDone:
+                pass
+            attempt += 1
+    finally:
+        profiler.stop()
+        controls.override()
+    return summarize(profiler.captured)
+
+
+# Scenes whose mean or p95 frame time grew by more than `threshold` over the baseline.
+def regressions(results, baseline, threshold):
+    found = []
+    for name, result in results.items():
+        before = baseline.get("scenes", {}).get(name)
+        if before is None:
+            continue
+        for key in ("mean_ms", "p95_ms"):
+            if result[key] > before[key] * (1 + threshold):
+                found.append((name, key, before[key], result[key]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the frame times of every game loop and menu.")
+    parser.add_argument("--scene", action="append", choices=sorted(SCENES),
+                        help="scene to run, may be repeated (default: all)")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed slowdown over the baseline, 0.15 = 15%%")
+    args = parser.parse_args(argv)
+
+    out = os.path.abspath(args.out)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Every frame advances the simulation by exactly one tick, as at 60 fps.
+    FixedTimestep.dt_override = 1 / 60
+
+    results = {}
+    skipped = {}
+    for name in args.scene or SCENES:
+        # A game whose files aren't there is reported and left out, not the end of the run.
+        try:
+            result = run_scene(name, args.frames, args.seed)
+        except (OSError, pygame.error) as e:
+            skipped[name] = f"{type(e).__name__}: {e}"
+            print(f"{name:16} skipped, {skipped[name]}")
+            continue
+        results[name] = result
+        phases = " ".join(f"{phase}={ms:.2f}" for phase, ms in result["phases_ms"].items())
+        print(f"{name:16} mean={result['mean_ms']:.2f} p50={result['p50_ms']:.2f} "
+              f"p95={result['p95_ms']:.2f} p99={result['p99_ms']:.2f} ms | {phases}")
+
+    with open(out, "w") as f:
+        json.dump({"frames": args.frames, "seed": args.seed, "scenes": results, "skipped": skipped}, f, indent=2)
+    print(f"results written to {out}")
+
+    if baseline is not None:
+        found = regressions(results, baseline, args.threshold)
+        for name in skipped:
+            if name in baseline.get("scenes", {}):
+                print(f"{name} not compared: skipped this run")
+        for name, key, before, after in found:
+            print(f"REGRESSION {name} {key}: {before:.2f} -> {after:.2f} ms "
+                  f"(+{(after / before - 1) * 100:.0f}%)")
+        if found:
+            return 1
+        print(f"no regressions over {args.threshold * 100:.0f}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
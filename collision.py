@@ -0,0 +1,82 @@
+from bisect import bisect_left, insort
+from weakref import WeakKeyDictionary
+
+import pygame
+
+
+class MaskCache:
+    def __init__(self):
+        self.masks = WeakKeyDictionary()
+        self.built = 0
+
+    # Surfaces from the asset cache are shared, so this builds one mask per unique
+    # scaled/flipped image no matter how many sprites use it.
+    def get(self, surface):
+        mask = self.masks.get(surface)
+        if mask is None:
+            mask = pygame.mask.from_surface(surface)
+            self.masks[surface] = mask
+            self.built += 1
+        return mask
+
+
+masks = MaskCache()
+
+
+def _left(sprite):
+    return sprite.rect.left
+
+
+# Broadphase for obstacles that all scroll left at the same speed: their order by x
+# never changes, so they are kept sorted once on insertion and each query only
+# bisects to the few near the player before doing rect and then mask checks.
+class SweepCollider:
+    def __init__(self, pixel_perfect=True, mask_cache=masks):
+        self.pixel_perfect = pixel_perfect
+        self.mask_cache = mask_cache
+        self.sprites = []
+        self.max_width = 0
+        self.rect_checks = 0
+        self.mask_checks = 0
+
+    def add(self, sprite):
+        insort(self.sprites, sprite, key=_left)
+        self.max_width = max(self.max_width, sprite.rect.width)
+
+    def clear(self):
+        self.sprites.clear()
+        self.max_width = 0
+
+    # Call after the obstacles moved and before any are respawned from a pool.
+    def prune(self):
+        # Obstacles leave through the left edge, so dead ones collect at the front.
+        dead = 0
+        for sprite in self.sprites:
+            if sprite.alive():
+                break
+            dead += 1
+        if dead:
+            del self.sprites[:dead]
+
+    def collide(self, sprite):
+        rect = sprite.rect
+        sprites = self.sprites
+        i = bisect_left(sprites, rect.left - self.max_width, key=_left)
+        mask = None
+        for i in range(i, len(sprites)):
+            other = sprites[i]
+            other_rect = other.rect
+            if other_rect.left >= rect.right:
+                break
+            self.rect_checks += 1
+            if not rect.colliderect(other_rect) or not other.alive():
+                continue
+            if not self.pixel_perfect:
+                return other
+            self.mask_checks += 1
+            if mask is None:
+                mask = self.mask_cache.get(sprite.image)
+            offset = (other_rect.x - rect.x, other_rect.y - rect.y)
+            if mask.overlap(self.mask_cache.get(other.image), offset):
+                return other
+        return None
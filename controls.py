@@ -0,0 +1,92 @@
+import random
+
+import pygame
+
+
+class Keys:
+    __slots__ = ("pressed",)
+
+    def __init__(self, pressed=()):
+        self.pressed = frozenset(pressed)
+
+    # Indexed like pygame.key.get_pressed(), so Player.update reads either one.
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+NO_KEYS = Keys()
+
+
+class KeyboardInput:
+    def read(self):
+        return pygame.key.get_pressed()
+
+
+class MouseInput:
+    def pos(self):
+        return pygame.mouse.get_pos()
+
+
+class ScriptedInput:
+    def __init__(self, frames, loop=False):
+        # One collection of pressed keys per tick.
+        self.frames = [Keys(keys) for keys in frames]
+        self.loop = loop
+        self.tick = 0
+
+    def read(self):
+        if self.tick < len(self.frames):
+            keys = self.frames[self.tick]
+        elif self.loop and self.frames:
+            keys = self.frames[self.tick % len(self.frames)]
+        else:
+            keys = NO_KEYS
+        self.tick += 1
+        return keys
+
+
+class RandomInput:
+    def __init__(self, seed=None, jump=0.05, jetpack=0.01, right=0.5):
+        self.rng = random.Random(seed)
+        self.chances = ((pygame.K_SPACE, jump), (pygame.K_j, jetpack), (pygame.K_RIGHT, right))
+
+    def read(self):
+        return Keys(key for key, chance in self.chances if self.rng.random() < chance)
+
+
+class ScriptedPointer:
+    def __init__(self, positions, loop=True):
+        # One mouse position per frame.
+        self.positions = list(positions)
+        self.loop = loop
+        self.frame = 0
+
+    def pos(self):
+        if self.frame < len(self.positions):
+            pos = self.positions[self.frame]
+        elif self.loop and self.positions:
+            pos = self.positions[self.frame % len(self.positions)]
+        else:
+            pos = (0, 0)
+        self.frame += 1
+        return pos
+
+
+# The loops ask for their input sources here instead of polling pygame directly, so a
+# harness such as bench.py can drive them with scripted ones.
+_overrides = {"keys": None, "pointer": None}
+
+
+def override(keys=None, pointer=None):
+    _overrides["keys"] = keys
+    _overrides["pointer"] = pointer
+
+
+def keyboard_input():
+    keys = _overrides["keys"]
+    return keys if keys is not None else KeyboardInput()
+
+
+def pointer_input():
+    pointer = _overrides["pointer"]
+    return pointer if pointer is not None else MouseInput()
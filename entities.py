@@ -0,0 +1,287 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pygame
+
+from profiler import profiler
+
+# pygame-ce has Surface.fblits, a blits() that skips building the list of rects.
+HAS_FBLITS = hasattr(pygame.Surface, "fblits")
+
+
+# Struct-of-arrays store for large numbers of simple moving things (coins,
+# projectiles, particles): position, velocity, lifetime and sprite id live in
+# contiguous NumPy arrays, so movement, ageing and culling are a handful of array
+# operations per tick instead of a Python update() per object. Velocities are in
+# pixels per tick, like the obstacles. A negative lifetime never runs out. Removing
+# entities compacts the arrays, so indices are only valid until the next update().
+class EntityStore:
+    # One array per field; subclasses add their own.
+    FIELDS = {"x": np.float64, "y": np.float64, "vx": np.float64, "vy": np.float64,
+              "life": np.int32, "sprite": np.int32}
+
+    def __init__(self, capacity=1024, bounds=None):
+        self.count = 0
+        self.capacity = 0
+        self.bounds = pygame.Rect(bounds) if bounds is not None else None
+        self.images = []
+        self.scaled = {}
+        self.sizes = np.zeros((0, 2), np.float64)
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(0, dtype))
+        self._grow(capacity)
+
+    def _grow(self, needed):
+        capacity = max(needed, self.capacity * 2, 64)
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    # Registers an image and returns its sprite id.
+    def add_sprite(self, image):
+        self.images.append(image)
+        self.sizes = np.vstack([self.sizes, image.get_size()])
+        return len(self.images) - 1
+
+    # Every argument may be a scalar or an array; they are broadcast together and one
+    # entity is added per element. Returns the slice of the new entities.
+    def spawn(self, x, y, vx=0.0, vy=0.0, life=-1, sprite=0):
+        n = np.broadcast(x, y, vx, vy, life, sprite).size
+        start = self.count
+        if start + n > self.capacity:
+            self._grow(start + n)
+        end = start + n
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.vx[start:end] = vx
+        self.vy[start:end] = vy
+        self.life[start:end] = life
+        self.sprite[start:end] = sprite
+        self.count = end
+        return slice(start, end)
+
+    def update(self):
+        n = self.count
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        life = self.life[:n]
+        np.subtract(life, 1, out=life, where=life > 0)
+        return self.cull()
+
+    # Drops expired entities and, with bounds, those entirely outside them. Returns
+    # how many were removed.
+    def cull(self):
+        n = self.count
+        keep = self.life[:n] != 0
+        if self.bounds is not None:
+            size = self.sizes[self.sprite[:n]]
+            x, y = self.x[:n], self.y[:n]
+            left, top, right, bottom = self.bounds.left, self.bounds.top, self.bounds.right, self.bounds.bottom
+            keep &= (x + size[:, 0] > left) & (x < right) & (y + size[:, 1] > top) & (y < bottom)
+        return self.keep(keep)
+
+    def keep(self, mask):
+        n = self.count
+        index = np.flatnonzero(mask)
+        kept = len(index)
+        if kept == n:
+            return 0
+        for name in self.FIELDS:
+            a = getattr(self, name)
+            a[:kept] = a[:n][index]
+        self.count = kept
+        return n - kept
+
+    def clear(self):
+        self.count = 0
+
+    # Top-left positions, stepped back along the velocity for interpolation.
+    def positions(self, alpha=1.0, scale=1.0):
+        n = self.count
+        back = 1.0 - alpha
+        x = self.x[:n] - self.vx[:n] * back if back else self.x[:n]
+        y = self.y[:n] - self.vy[:n] * back if back else self.y[:n]
+        if scale != 1.0:
+            x = x * scale
+            y = y * scale
+        return np.rint(x).astype(np.int32), np.rint(y).astype(np.int32)
+
+    # The sprite images scaled down for drawing at an internal resolution.
+    def scaled_images(self, scale):
+        images = self.scaled.get(scale)
+        if images is None or len(images) != len(self.images):
+            images = [pygame.transform.smoothscale(image, (max(1, round(image.get_width() * scale)),
+                                                           max(1, round(image.get_height() * scale))))
+                      for image in self.images]
+            self.scaled[scale] = images
+        return images
+
+    # Draws at `scale` times the stored positions and sizes. Returns the rect covering
+    # everything drawn, or None when there was nothing.
+    def draw(self, surface, alpha=1.0, scale=1.0):
+        if not self.count:
+            return None
+        x, y = self.positions(alpha, scale)
+        sprite = self.sprite[:self.count]
+        images = self.images if scale == 1.0 else self.scaled_images(scale)
+        blits = zip(map(images.__getitem__, sprite.tolist()), zip(x.tolist(), y.tolist()))
+        if HAS_FBLITS:
+            surface.fblits(blits)
+        else:
+            surface.blits(blits, False)
+        size = self.sizes[sprite] * scale
+        left, top = int(x.min()), int(y.min())
+        return pygame.Rect(left, top, int((x + size[:, 0]).max()) - left, int((y + size[:, 1]).max()) - top)
+
+    def __len__(self):
+        return self.count
+
+
+# What the stress scene spawns, as plain sprites: the per-object update() and
+# Group.draw() the obstacles use, for comparison with the store.
+class _Mover(pygame.sprite.Sprite):
+    def __init__(self, image, x, y, vx, vy, life, bounds):
+        super().__init__()
+        self.image = image
+        self.rect = image.get_rect(topleft=(round(x), round(y)))
+        self.x, self.y, self.vx, self.vy, self.life = x, y, vx, vy, life
+        self.bounds = bounds
+
+    def update(self):
+        self.x += self.vx
+        self.y += self.vy
+        self.rect.topleft = (round(self.x), round(self.y))
+        self.life -= 1
+        if self.life == 0 or not self.bounds.colliderect(self.rect):
+            self.kill()
+
+
+class _SpriteStore:
+    def __init__(self, bounds):
+        self.bounds = pygame.Rect(bounds)
+        self.group = pygame.sprite.Group()
+        self.images = []
+
+    def add_sprite(self, image):
+        self.images.append(image)
+        return len(self.images) - 1
+
+    def spawn(self, x, y, vx, vy, life, sprite):
+        for args in zip(x.tolist(), y.tolist(), vx.tolist(), vy.tolist(), life.tolist(), sprite.tolist()):
+            *motion, life, sprite = args
+            self.group.add(_Mover(self.images[sprite], *motion, life, self.bounds))
+
+    def update(self):
+        self.group.update()
+
+    def draw(self, surface, alpha=1.0):
+        self.group.draw(surface)
+
+    def __len__(self):
+        return len(self.group)
+
+
+def stress_sprites(size=16, colors=((255, 210, 60), (120, 220, 255), (255, 110, 90), (160, 255, 140))):
+    images = []
+    for color in colors:
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(image, color, (size // 2, size // 2), size // 2)
+        pygame.draw.circle(image, (255, 255, 255), (size // 2 - 2, size // 2 - 2), size // 6)
+        images.append(image.convert_alpha())
+    return images
+
+
+# Keeps `count` entities drifting across the screen, respawning whatever expired or
+# left it, and times whole frames (update, draw and present) without a frame cap.
+def stress_level(screen, store, rng, count, frames):
+    width, height = screen.get_size()
+    sprites = len(store.images)
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        profiler.begin("stress")
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return None
+            profiler.handle(event)
+        profiler.mark("input")
+
+        store.update()
+        missing = count - len(store)
+        if missing > 0:
+            store.spawn(rng.uniform(0, width, missing), rng.uniform(0, height, missing),
+                        rng.uniform(-4, 4, missing), rng.uniform(-4, 4, missing),
+                        rng.integers(60, 240, missing), rng.integers(0, sprites, missing))
+        profiler.mark("spawn")
+
+        screen.fill((12, 12, 24))
+        store.draw(screen)
+        profiler.draw_overlay(screen)
+        profiler.mark("draw")
+        pygame.display.flip()
+        profiler.mark("present")
+        profiler.end()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# Raises the entity count by `growth` each level until the 95th percentile frame no
+# longer fits the frame budget; the last level that did is what can be sustained.
+def stress(screen, mode="store", fps=60, start=500, growth=1.25, frames=120, seed=0, limit=1_000_000):
+    bounds = screen.get_rect()
+    store = EntityStore(start, bounds) if mode == "store" else _SpriteStore(bounds)
+    for image in stress_sprites():
+        store.add_sprite(image)
+    rng = np.random.default_rng(seed)
+    budget = 1000 / fps
+    sustained = 0
+    count = start
+    while count <= limit:
+        times = stress_level(screen, store, rng, count, frames)
+        if times is None:
+            break
+        ms = np.array(times[frames // 4:]) * 1000
+        p95 = float(np.percentile(ms, 95))
+        print(f"{mode:7} {count:8} entities: mean={ms.mean():.2f} p95={p95:.2f} ms")
+        if p95 > budget:
+            break
+        sustained = count
+        count = int(count * growth)
+    return sustained
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find how many entities can be moved and drawn at a frame rate.")
+    parser.add_argument("--mode", choices=("store", "sprites", "both"), default="both",
+                        help="EntityStore, a pygame.sprite.Group of the same entities, or both")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate to sustain")
+    parser.add_argument("--start", type=int, default=500, help="entities in the first level")
+    parser.add_argument("--growth", type=float, default=1.25, help="entity count multiplier per level")
+    parser.add_argument("--frames", type=int, default=120, help="frames per level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--headless", action="store_true", help="use the dummy video driver")
+    args = parser.parse_args(argv)
+
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.init()
+    screen = pygame.display.set_mode((1280, 720))
+    pygame.display.set_caption("Entity stress test")
+
+    modes = ("store", "sprites") if args.mode == "both" else (args.mode,)
+    results = {mode: stress(screen, mode, args.fps, args.start, args.growth, args.frames, args.seed)
+               for mode in modes}
+    for mode, count in results.items():
+        print(f"{mode}: {count} entities sustained at {args.fps} fps")
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
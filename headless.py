@@ -0,0 +1,85 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from controls import RandomInput, ScriptedInput
+from pool import obstacle_pool
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+GAMES = {
+    "main": "main.py",
+    "makeshift2": os.path.join("makeshift2", "barath.py"),
+    "jurassic": os.path.join("jurassic jumper", "main.py"),
+}
+
+_loaded = {}
+
+
+# Imports a game script without starting its loop. Asset paths in the games are
+# relative, so this also switches into the game's directory.
+def load_game(name):
+    path = os.path.join(ROOT, GAMES[name])
+    os.chdir(os.path.dirname(path))
+    if name not in _loaded:
+        spec = importlib.util.spec_from_file_location(f"game_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _loaded[name] = module
+    return _loaded[name]
+
+
+def simulate(game, inputs, max_ticks=100_000, seed=None):
+    run = game.new_run(seed)
+    start = time.perf_counter()
+    while not run.over and run.ticks < max_ticks:
+        run.step(inputs.read())
+    seconds = time.perf_counter() - start
+    return {
+        "ticks": run.ticks,
+        "score": run.score,
+        "health": run.player.health,
+        "over": run.over,
+        "seconds": seconds,
+        "ticks_per_ms": run.ticks / (seconds * 1000) if seconds else float("inf"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the runner simulation headless at full speed.")
+    parser.add_argument("--game", choices=sorted(GAMES), default="jurassic")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--ticks", type=int, default=100_000, help="tick limit per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--inputs", choices=("random", "idle"), default="random")
+    parser.add_argument("--jump", type=float, default=0.05, help="chance of holding SPACE on a tick")
+    parser.add_argument("--jetpack", type=float, default=0.01, help="chance of holding J on a tick")
+    args = parser.parse_args(argv)
+
+    game = load_game(args.game)
+    total_ticks = 0
+    total_seconds = 0.0
+    for i in range(args.runs):
+        seed = args.seed + i
+        if args.inputs == "random":
+            inputs = RandomInput(seed, jump=args.jump, jetpack=args.jetpack)
+        else:
+            inputs = ScriptedInput([])
+        result = simulate(game, inputs, args.ticks, seed)
+        total_ticks += result["ticks"]
+        total_seconds += result["seconds"]
+        print(f"run {i} seed={seed}: score={result['score']} health={result['health']} "
+              f"ticks={result['ticks']} ({result['ticks_per_ms']:.1f} ticks/ms)")
+
+    print(f"{args.runs} runs, {total_ticks} ticks in {total_seconds * 1000:.1f} ms "
+          f"({total_ticks / max(total_seconds * 1000, 1e-9):.1f} ticks/ms)")
+    pool = obstacle_pool.stats()
+    print(f"obstacles: {pool['allocated']} allocated, {pool['reused']} reused from the pool")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import pygame
+
+from text_cache import texts
+
+
+class HudLine:
+    __slots__ = ("label", "pos", "surface", "value", "number_x", "rect")
+
+    def __init__(self, label, pos):
+        self.label = label
+        self.pos = pos
+        self.surface = None
+        self.value = None
+        self.number_x = label.get_width()
+        self.rect = pygame.Rect(pos, (0, 0))
+
+
+# Score/health overlay built from glyphs rendered once. Each line keeps its own
+# surface and is only recomposed when its value changes, by blitting cached digit
+# glyphs after the label, so a frame never rasterizes text.
+class Hud:
+    def __init__(self, font, color, lines, digits=8):
+        self.glyphs = {char: texts.render(char, color, font) for char in "0123456789-"}
+        self.digit_width = max(glyph.get_width() for glyph in self.glyphs.values())
+        self.height = max(glyph.get_height() for glyph in self.glyphs.values())
+        self.lines = [HudLine(texts.render(label, color, font), pos) for label, pos in lines]
+        for line in self.lines:
+            self._resize(line, digits)
+        self.dirty = set()
+
+    def _resize(self, line, digits):
+        width = line.number_x + digits * self.digit_width
+        height = max(self.height, line.label.get_height())
+        line.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        line.surface.blit(line.label, (0, 0))
+        line.rect.size = (width, height)
+        line.value = None
+
+    def set(self, *values):
+        for i, (line, value) in enumerate(zip(self.lines, values)):
+            if value != line.value:
+                self._compose(line, value)
+                self.dirty.add(i)
+
+    def _compose(self, line, value):
+        text = str(value)
+        if line.number_x + len(text) * self.digit_width > line.surface.get_width():
+            self._resize(line, len(text) * 2)
+
+        surface = line.surface
+        surface.fill((0, 0, 0, 0), (line.number_x, 0, surface.get_width() - line.number_x, surface.get_height()))
+        x = line.number_x
+        glyphs = self.glyphs
+        for char in text:
+            glyph = glyphs[char]
+            surface.blit(glyph, (x, 0))
+            x += glyph.get_width()
+        line.value = value
+
+    def items(self):
+        return [(line.surface, line.pos) for line in self.lines]
+
+    # Indices of the lines recomposed since the last call; renderers use this to
+    # know when a line must be repainted even though its surface object is the same.
+    def take_dirty(self):
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    def dirty_rects(self):
+        return [self.lines[i].rect for i in sorted(self.dirty)]
@@ -1,3 +1,6 @@
+from text_cache import texts
+
+
 class Button():
 	def __init__(self, image, pos, text_input, font, base_color, hovering_color):
 		self.image = image
@@ -6,7 +9,9 @@ class Button():
 		self.font = font
 		self.base_color, self.hovering_color = base_color, hovering_color
 		self.text_input = text_input
-		self.text = self.font.render(self.text_input, True, self.base_color)
+		self.base_text = texts.render(self.text_input, self.base_color, self.font)
+		self.hover_text = texts.render(self.text_input, self.hovering_color, self.font)
+		self.text = self.base_text
 		if self.image is None:
 			self.image = self.text
 		self.rect = self.image.get_rect(center=(self.x_pos, self.y_pos))
@@ -24,6 +29,6 @@ class Button():
 
 	def changeColor(self, position):
 		if position[0] in range(self.rect.left, self.rect.right) and position[1] in range(self.rect.top, self.rect.bottom):
-			self.text = self.font.render(self.text_input, True, self.hovering_color)
+			self.text = self.hover_text
 		else:
-			self.text = self.font.render(self.text_input, True, self.base_color)
\ No newline at end of file
+			self.text = self.base_text
@@ -1,75 +1,74 @@
 import pygame
 import sys
-import random
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from asset_cache import assets
+from text_cache import fonts
+from hud import Hud
+from render import make_renderer
+from controls import keyboard_input
+from runner import RunnerSim
+from pool import Entity
+from spawns import Pattern, SpawnStream
+from timestep import FixedTimestep, Interpolated, display_fps
+from profiler import profiler
+from replay import recording
+from particles import Effects
+from leaderboard import Leaderboard, scores_path
+from quality import QualityGovernor, quality_steps
+from animation import PlayerAnimator, animations, sheet
+from parallax import ParallaxBackground
+from loader import AsyncLoader, loading_screen
 
 pygame.init()
 
 WIDTH, HEIGHT = 1280, 720
 FPS = 60
+DISPLAY_FPS = display_fps(default=FPS)
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 RED = (255, 50, 50)
 
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
+assets.use_pack("assets/assets.pack")
 pygame.display.set_caption("Cyber Runner")
 clock = pygame.time.Clock()
 
-class ParallaxBackground:
-    def __init__(self, image_paths):
-        self.images = [pygame.transform.scale(pygame.image.load(path).convert(), (WIDTH * 2, HEIGHT)) for path in image_paths]
-        self.index = 0
-        self.next_index = 0
-        self.scroll_x = 0
-        self.scroll_speed = 1
-        self.alpha = 255
-        self.fading = False
-        self.fade_speed = 5
-        self.current_img = self.images[self.index].copy()
-        self.next_img = self.images[self.index].copy()
-
-    def update(self):
-        self.scroll_x -= self.scroll_speed
-        if self.scroll_x <= -WIDTH:
-            self.scroll_x = 0
-
-        if self.fading:
-            self.alpha -= self.fade_speed
-            if self.alpha <= 0:
-                self.alpha = 255
-                self.fading = False
-                self.index = self.next_index
-                self.current_img = self.images[self.index].copy()
-
-    def draw(self, surface):
-        bg_img = self.current_img.copy()
-        bg_img.set_alpha(255)
-        surface.blit(bg_img, (self.scroll_x, 0))
-        surface.blit(bg_img, (self.scroll_x + WIDTH * 2, 0))
-
-        if self.fading:
-            next_img = self.images[self.next_index].copy()
-            next_img.set_alpha(255 - self.alpha)
-            surface.blit(next_img, (self.scroll_x, 0))
-            surface.blit(next_img, (self.scroll_x + WIDTH * 2, 0))
-
-    def set_background(self, index):
-        if 0 <= index < len(self.images) and index != self.index:
-            self.next_index = index
-            self.fading = True
-            self.alpha = 255
-
-class Player(pygame.sprite.Sprite):
+BARREL_IMAGE = ("assets/toxic_barrel.png", (64, 64))
+CEILING_LASER_IMAGE = ("assets/laser_vertical.png", (32, 200))
+FLOOR_LASER_IMAGE = ("assets/laser_vertical.png", (32, 200), False, True)
+BACKGROUND_IMAGES = [
+    "assets/bg0.png",  # City
+    "assets/bg1.png",  # Dark Oak
+    "assets/bg2.png",  # Dry
+    "assets/bg3.png"   # Nuclear
+]
+
+# Everything a run draws, decoded on loader threads behind the loading screen
+GAME_IMAGES = [
+    "assets/p2_walk.png",
+    "assets/p2_jump.png",
+    ("assets/jetpack_200x200_transparent.png", (150, 150)),
+    ("assets/flame.png", (80, 80)),
+    BARREL_IMAGE,
+    CEILING_LASER_IMAGE,
+    FLOOR_LASER_IMAGE,
+] + [(path, (WIDTH * 2, HEIGHT), False, False, False) for path in BACKGROUND_IMAGES]
+loader = AsyncLoader()
+effects = Effects(screen.get_rect())
+leaderboard = Leaderboard(scores_path(), "jurassic")
+
+class Player(pygame.sprite.Sprite, Interpolated):
     def __init__(self):
         super().__init__()
-        self.animations = {
-            "idle": [pygame.image.load("assets/p2_walk.png")],
-            "run": [pygame.image.load("assets/p2_walk.png")],
-            "jump": [pygame.image.load("assets/p2_jump.png")],
-            "fly": [pygame.image.load("assets/p2_jump.png")],
-        }
-        self.state = "idle"
-        self.anim_index = 0
-        self.image = self.animations[self.state][0]
+        self.animator = PlayerAnimator(animations({
+            "idle": sheet("assets/p2_walk.png"),
+            "run": sheet("assets/p2_walk.png"),
+            "jump": sheet("assets/p2_jump.png"),
+            "fly": sheet("assets/p2_jump.png"),
+        }))
+        self.image = self.animator.image
         self.rect = self.image.get_rect()
         self.rect.center = (100, HEIGHT // 2)
         self.velocity_y = 0
@@ -81,10 +80,9 @@ class Player(pygame.sprite.Sprite):
         self.jetpack_enabled = False
         self.jetpack_timer = 0
         self.is_flying = False
-        raw_jetpack = pygame.image.load("assets/jetpack_200x200_transparent.png").convert_alpha()
-        self.jetpack_img = pygame.transform.scale(raw_jetpack, (150, 150))
-        raw_flame = pygame.image.load("assets/flame.png").convert_alpha()
-        self.flame_img = pygame.transform.scale(raw_flame, (80, 80))
+        self.exhaust = None
+        self.jetpack_img = assets.image("assets/jetpack_200x200_transparent.png", (150, 150))
+        self.flame_img = assets.image("assets/flame.png", (80, 80))
         self.health = 3
         self.max_health = 3
 
@@ -92,8 +90,9 @@ class Player(pygame.sprite.Sprite):
         self.jetpack_enabled = True
         self.jetpack_timer = duration
 
-    def update(self):
-        keys = pygame.key.get_pressed()
+    def update(self, keys=None):
+        if keys is None:
+            keys = pygame.key.get_pressed()
         if keys[pygame.K_j] and not self.jetpack_enabled:
             self.activate_jetpack()
         if self.jetpack_enabled and keys[pygame.K_SPACE]:
@@ -123,37 +122,30 @@ class Player(pygame.sprite.Sprite):
             self.jetpack_timer -= 1
             if self.jetpack_timer <= 0:
                 self.jetpack_enabled = False
+        if self.exhaust is not None:
+            self.exhaust.stream(self.rect.left + 47, self.rect.bottom + 10,
+                                self.jetpack_enabled and self.is_flying)
+        self.image = self.animator.update(self, keys, 1 / FPS)
+
+    def parts(self, alpha=1.0):
+        left, top = self.lerp_pos(alpha)
+        bottom = top + self.rect.height
+        parts = [(self.jetpack_img, (left - 30, top + 15))]
         if self.jetpack_enabled and self.is_flying:
-            self.state = "fly"
-        elif not self.grounded:
-            self.state = "jump"
-        else:
-            self.state = "run" if keys[pygame.K_RIGHT] else "idle"
-        self.animate()
-
-    def animate(self):
-        frames = self.animations[self.state]
-        self.anim_index += 0.1
-        if self.anim_index >= len(frames):
-            self.anim_index = 0
-        self.image = frames[int(self.anim_index)]
-
-    def draw(self, surface):
-        jetpack_x = self.rect.left - 30
-        jetpack_y = self.rect.top + 15
-        surface.blit(self.jetpack_img, (jetpack_x, jetpack_y))
-        if self.jetpack_enabled and self.is_flying:
-            flame_x = self.rect.left  +7
-            flame_y = self.rect.bottom - 70
-            surface.blit(self.flame_img, (flame_x, flame_y))
-        surface.blit(self.image, self.rect)
+            parts.append((self.flame_img, (left + 7, bottom - 70)))
+        parts.append((self.image, (left, top)))
+        return parts
 
-class ToxicBarrel(pygame.sprite.Sprite):
-    def __init__(self, x):
-        super().__init__()
-        self.image = pygame.image.load("assets/toxic_barrel.png").convert_alpha()
-        self.image = pygame.transform.scale(self.image, (64, 64))
-        self.rect = self.image.get_rect()
+    def draw(self, surface, alpha=1.0):
+        for image, pos in self.parts(alpha):
+            surface.blit(image, pos)
+
+class ToxicBarrel(Entity):
+    __slots__ = ()
+
+    def spawn(self, x):
+        self.image = assets.image(*BARREL_IMAGE)
+        self.rect.size = self.image.get_size()
         self.rect.x = x
         self.rect.y = HEIGHT - self.rect.height - 20
 
@@ -162,12 +154,12 @@ class ToxicBarrel(pygame.sprite.Sprite):
         if self.rect.right < 0:
             self.kill()
 
-class CeilingLaser(pygame.sprite.Sprite):
-    def __init__(self, x):
-        super().__init__()
-        self.image = pygame.image.load("assets/laser_vertical.png").convert_alpha()
-        self.image = pygame.transform.scale(self.image, (32, 200))
-        self.rect = self.image.get_rect()
+class CeilingLaser(Entity):
+    __slots__ = ()
+
+    def spawn(self, x):
+        self.image = assets.image(*CEILING_LASER_IMAGE)
+        self.rect.size = self.image.get_size()
         self.rect.x = x
         self.rect.y = 0
 
@@ -176,13 +168,12 @@ class CeilingLaser(pygame.sprite.Sprite):
         if self.rect.right < 0:
             self.kill()
 
-class FloorLaser(pygame.sprite.Sprite):
-    def __init__(self, x):
-        super().__init__()
-        self.image = pygame.image.load("assets/laser_vertical.png").convert_alpha()
-        self.image = pygame.transform.flip(self.image, False, True)
-        self.image = pygame.transform.scale(self.image, (32, 200))
-        self.rect = self.image.get_rect()
+class FloorLaser(Entity):
+    __slots__ = ()
+
+    def spawn(self, x):
+        self.image = assets.image(*FLOOR_LASER_IMAGE)
+        self.rect.size = self.image.get_size()
         self.rect.x = x
         self.rect.bottom = HEIGHT - 20
 
@@ -191,81 +182,79 @@ class FloorLaser(pygame.sprite.Sprite):
         if self.rect.right < 0:
             self.kill()
 
-def main():
-    player = Player()
-    obstacle_group = pygame.sprite.Group()
-    background = ParallaxBackground([
-        "assets/bg0.png",  # City
-        "assets/bg1.png",  # Dark Oak
-        "assets/bg2.png",  # Dry
-        "assets/bg3.png"   # Nuclear
-    ])
-
-    obstacle_timer = 0
-    score = 0
-    font = pygame.font.SysFont("Arial", 30)
-    next_obstacle_type = "barrel"
+# Every 121 ticks, alternating a barrel with a ceiling or floor laser.
+PATTERN = Pattern(121, WIDTH, 200, (("barrel",), ("ceiling_laser", "floor_laser")))
+OBSTACLE_TYPES = {"barrel": ToxicBarrel, "ceiling_laser": CeilingLaser, "floor_laser": FloorLaser}
+
+def new_run(seed=None, collider=None):
+    assets.preload([BARREL_IMAGE, CEILING_LASER_IMAGE, FLOOR_LASER_IMAGE])
+    return RunnerSim(Player(), SpawnStream(seed, PATTERN), OBSTACLE_TYPES, collider)
+
+def main(seed=None):
+    leaderboard.start()
+    loader.load(GAME_IMAGES)
+    loading_screen(screen, loader, clock)
+
+    run = new_run(seed)
+    effects.attach(run)
+    keyboard = keyboard_input()
+    recorder = recording(run, "jurassic")
+    if recorder is not None:
+        keyboard = recorder.wrap(keyboard)
+    background = ParallaxBackground(BACKGROUND_IMAGES, (WIDTH * 2, HEIGHT))
+
+    hud = Hud(fonts.sys("Arial", 30), WHITE, [("Score: ", (10, 10)), ("Health: ", (10, 40))])
+    renderer = make_renderer(screen, background)
+    governor = QualityGovernor(quality_steps(background=background, renderer=renderer, effects=effects), 1000 / (DISPLAY_FPS or FPS))
+    timestep = FixedTimestep(1 / FPS)
     current_bg_index = -1  # Track current background index
 
     running = True
-    while running:
-        clock.tick(FPS)
+    clock.tick()
+    while running and not run.over:
+        dt = clock.tick(DISPLAY_FPS) / 1000
+        governor.frame(clock.get_rawtime())
+        profiler.begin("jurassic")
         for event in pygame.event.get():
+            profiler.handle(event)
             if event.type == pygame.QUIT:
                 running = False
-
-        player.update()
-        obstacle_group.update()
-
-        obstacle_timer += 1
-        if obstacle_timer > 120:
-            x = WIDTH + random.randint(0, 200)
-            if next_obstacle_type == "barrel":
-                obstacle = ToxicBarrel(x)
-                next_obstacle_type = "laser"
+        profiler.mark("input")
+
+        for _ in range(timestep.advance(dt)):
+            run.step(keyboard.read())
+            score = run.score
+
+            if score < 1000:
+                bg_index = 0
+            elif score < 2000:
+                bg_index = 1
+            elif score < 3000:
+                bg_index = 2
             else:
-                obstacle = random.choice([CeilingLaser(x), FloorLaser(x)])
-                next_obstacle_type = "barrel"
-            obstacle_group.add(obstacle)
-            obstacle_timer = 0
-
-        score += 1
-
-        if score < 1000:
-            bg_index = 0
-        elif score < 2000:
-            bg_index = 1
-        elif score < 3000:
-            bg_index = 2
-        else:
-            bg_index = 3
-
-        if bg_index != current_bg_index:
-            background.set_background(bg_index)
-            current_bg_index = bg_index
+                bg_index = 3
 
-        background.update()
+            if bg_index != current_bg_index:
+                background.set_background(bg_index)
+                current_bg_index = bg_index
 
-        if pygame.sprite.spritecollide(player, obstacle_group, False):
-            player.health -= 1
-            obstacle_group.empty()
-            if player.health <= 0:
-                running = False
+            background.update()
+            if run.over:
+                break
 
-        screen.fill(BLACK)
-        background.draw(screen)
-        player.draw(screen)
-        obstacle_group.draw(screen)
+        hud.set(run.score, run.player.health)
+        profiler.mark("update")
+        renderer.draw(run.player, run.obstacles, hud, timestep.alpha, effects.particles)
+        profiler.end()
 
-        score_text = font.render(f"Score: {score}", True, WHITE)
-        health_text = font.render(f"Health: {player.health}", True, WHITE)
-        screen.blit(score_text, (10, 10))
-        screen.blit(health_text, (10, 40))
-
-        pygame.display.flip()
-
-    pygame.quit()
-    sys.exit()
+    if recorder is not None:
+        recorder.save()
+    if run.over:
+        leaderboard.submit(run.score, run.seed)
+        best = leaderboard.top(1)[0][0]
+        print(f"scores: {run.score}, best {best}")
 
 if __name__ == "__main__":
     main()
+    pygame.quit()
+    sys.exit()
@@ -0,0 +1,263 @@
+import argparse
+import atexit
+import os
+import pathlib
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from options import option
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    game TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    seed INTEGER,
+    name TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_top ON scores (game, score DESC);
+"""
+INSERT = "INSERT INTO scores (game, score, seed, name, created) VALUES (?, ?, ?, ?, ?)"
+TOP = "SELECT score, seed, name, created FROM scores WHERE game = ? ORDER BY score DESC LIMIT ?"
+
+
+# --scores=path on the command line (or SCORES_DB) picks the database; "off" keeps
+# scores in memory only. The default is scores.db in the game's directory.
+def scores_path(argv=None, default="scores.db"):
+    path = option("scores", "SCORES_DB", argv, default)
+    return None if path in ("", "off") else path
+
+
+def connect(path):
+    db = sqlite3.connect(path, check_same_thread=False)
+    try:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+    except sqlite3.Error:
+        db.close()
+        raise
+    return db
+
+
+# Opens an existing database for reading only, so looking at scores never creates one.
+def connect_readonly(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no scores database at {os.path.abspath(path)}")
+    return sqlite3.connect(pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro", uri=True)
+
+
+# High scores for one game. The game loop only ever touches memory: submit() puts
+# the score in the top-N cache that top() returns and queues it, and a writer thread
+# stores queued scores in SQLite (WAL), as many per transaction as have piled up by
+# the time it gets to them. The thread starts on start() or the first submit() and
+# first reads the stored top N, so until that is in, top() has only this session's
+# scores. `version` changes with the cache, for drawing code that wants to re-render
+# only then. A database that can't be opened or written (locked, read-only) is
+# reported as a scores: line and the failed scores are retried with the next batch;
+# whatever still isn't stored by close() is reported too.
+class Leaderboard:
+    def __init__(self, path, game, size=10, batch=256):
+        self.path = path
+        self.game = game
+        self.size = size
+        self.batch = batch
+        self.lock = threading.Lock()
+        self.best = []
+        self.version = 0
+        self.written = 0
+        self.batches = 0
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+
+    def start(self):
+        if self.path is not None and self.thread is None:
+            self.thread = threading.Thread(target=self._writer, name="leaderboard", daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def submit(self, score, seed=None, name=""):
+        entry = (score, seed, name, time.time())
+        self._merge([entry])
+        if self.path is not None:
+            self.start()
+            self.queue.put(entry)
+
+    def top(self, n=None):
+        return self.best[:n]
+
+    def _merge(self, entries):
+        with self.lock:
+            best = sorted(self.best + entries, key=lambda entry: entry[0], reverse=True)[:self.size]
+            if best != self.best:
+                self.best = best
+                self.version += 1
+
+    def _open(self):
+        try:
+            db = connect(self.path)
+            self._merge(db.execute(TOP, (self.game, self.size)).fetchall())
+        except sqlite3.Error as e:
+            print(f"scores: can't open {self.path}: {e}")
+            return None
+        return db
+
+    def _writer(self):
+        db = self._open()
+        pending = []
+        stop = False
+        while not stop:
+            entries = [self.queue.get()]
+            while len(entries) < self.batch:
+                try:
+                    entries.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if entries[-1] is None:
+                entries.pop()
+                stop = True
+            pending += entries
+            if not pending:
+                continue
+            if db is None:
+                db = self._open()
+                if db is None:
+                    continue
+            try:
+                with db:
+                    db.executemany(INSERT, [(self.game, *entry) for entry in pending])
+            except sqlite3.Error as e:
+                print(f"scores: can't save {len(pending)} scores to {self.path}: {e}")
+                continue
+            self.written += len(pending)
+            self.batches += 1
+            pending = []
+        if pending:
+            print(f"scores: {len(pending)} scores were not saved to {self.path}")
+        if db is not None:
+            db.close()
+
+    # Writes everything queued so far and stops the writer; runs at exit.
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+# What the benchmark's frames do: a fixed amount of busy work, calibrated to take
+# about `ms` milliseconds, like a light game frame.
+def _frame_work(ms):
+    rng = random.Random(0)
+    n = 1000
+    while True:
+        start = time.perf_counter()
+        for _ in range(n):
+            rng.random()
+        elapsed = time.perf_counter() - start
+        if elapsed > 0.01:
+            break
+        n *= 2
+    n = int(n * ms / 1000 / elapsed)
+
+    def work():
+        for _ in range(n):
+            rng.random()
+    return work
+
+
+def _percentile(times, p):
+    times = sorted(times)
+    return times[min(int(len(times) * p), len(times) - 1)]
+
+
+# Times frames that submit a score every `every` frames, with the score saved
+# nowhere (baseline), committed to SQLite right there in the frame the way a plain
+# save at game over would (sync, default journal and fsync on every commit), or
+# handed to a Leaderboard (async).
+def bench(path, frames, every, work_ms, fps):
+    work = _frame_work(work_ms)
+    results = {}
+    for mode in ("baseline", "sync", "async"):
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        rng = random.Random(0)
+        board = None
+        if mode == "async":
+            board = Leaderboard(path, "bench")
+            board.start()
+        if mode == "sync":
+            db = sqlite3.connect(path)
+            db.executescript(SCHEMA)
+        times = []
+        for frame in range(frames):
+            start = time.perf_counter()
+            work()
+            if frame % every == 0:
+                score = rng.randrange(10_000)
+                if mode == "sync":
+                    with db:
+                        db.execute(INSERT, ("bench", score, None, "", time.time()))
+                elif mode == "async":
+                    board.submit(score)
+            times.append((time.perf_counter() - start) * 1000)
+            # Idle out the rest of the frame like a capped game loop, which is when
+            # the writer gets to run.
+            rest = 1 / fps - (time.perf_counter() - start)
+            if rest > 0:
+                time.sleep(rest)
+        if board is not None:
+            board.close()
+            print(f"async: {board.written} scores in {board.batches} transactions")
+        if mode == "sync":
+            db.close()
+        results[mode] = times
+        print(f"{mode:8} mean={sum(times) / len(times):.3f} p99={_percentile(times, 0.99):.3f} "
+              f"max={max(times):.3f} ms per frame")
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the stored high scores, or time score writes in a frame loop.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="print a game's high scores")
+    show.add_argument("game", choices=("main", "main.race", "makeshift2", "jurassic"))
+    show.add_argument("--db", default="scores.db")
+    show.add_argument("--size", type=int, default=10)
+    timing = sub.add_parser("bench", help="compare frame times with and without score writes")
+    timing.add_argument("--db", default="bench_scores.db")
+    timing.add_argument("--frames", type=int, default=600)
+    timing.add_argument("--every", type=int, default=1, help="submit a score every this many frames")
+    timing.add_argument("--work", type=float, default=2.0, help="ms of work per frame")
+    timing.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        try:
+            db = connect_readonly(args.db)
+            rows = db.execute(TOP, (args.game, args.size)).fetchall()
+        except (OSError, sqlite3.Error) as e:
+            print(f"scores: can't read {args.db}: {e}")
+            return 1
+        db.close()
+        if not rows:
+            print(f"scores: no {args.game} scores in {args.db}")
+        for i, (score, seed, name, created) in enumerate(rows, 1):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(created))
+            print(f"{i:3}. {score:8} {name or '-':12} seed={seed} {when}")
+        return 0
+
+    bench(args.db, args.frames, args.every, args.work, args.fps)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from asset_cache import assets, image_key
+
+
+def _sound(path):
+    return pygame.mixer.Sound(path)
+
+
+# Decodes images and sounds on a small thread pool while the game keeps drawing.
+# Workers only produce unconverted surfaces; poll() converts and hands them to the
+# asset cache on the main thread, a few per frame. Anything a loop asks the cache
+# for before its job finished is simply loaded synchronously as before.
+class AsyncLoader:
+    def __init__(self, cache=assets, workers=None):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                           thread_name_prefix="loader")
+        self.pending = {}
+        self.requested = set()
+        self.total = 0
+        self.done = 0
+
+    def load(self, images=(), sounds=()):
+        for spec in images:
+            key = image_key(spec) if isinstance(spec, str) else image_key(*spec)
+            if key not in self.requested and key not in self.cache.surfaces:
+                self.requested.add(key)
+                self.pending[key] = self.executor.submit(self.cache.decode, key)
+                self.total += 1
+        for path in sounds:
+            key = ("sound", path)
+            if key not in self.requested and path not in self.cache.sounds:
+                self.requested.add(key)
+                self.pending[key] = self.executor.submit(_sound, path)
+                self.total += 1
+
+    # Adopts finished jobs until `budget` seconds were spent; returns the progress.
+    def poll(self, budget=0.004):
+        start = time.perf_counter()
+        for key, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            if key[0] == "sound":
+                self.cache.adopt_sound(key[1], future.result())
+            else:
+                self.cache.adopt(key, future.result())
+            self.done += 1
+            if time.perf_counter() - start > budget:
+                break
+        return self.progress
+
+    def wait(self):
+        for future in list(self.pending.values()):
+            future.result()
+        self.poll(float("inf"))
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    @property
+    def finished(self):
+        return not self.pending
+
+
+def draw_progress(surface, progress, rect, color=(255, 255, 255), back=(60, 60, 60)):
+    rect = pygame.Rect(rect)
+    pygame.draw.rect(surface, back, rect)
+    pygame.draw.rect(surface, color, (rect.x, rect.y, round(rect.width * progress), rect.height))
+
+
+# Keeps the window responsive with a progress bar until everything queued is in.
+def loading_screen(surface, loader, clock, fps=60):
+    width, height = surface.get_size()
+    bar = (width // 4, height // 2 - 6, width // 2, 12)
+    while not loader.finished:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+        loader.poll()
+        surface.fill((0, 0, 0))
+        draw_progress(surface, loader.progress, bar)
+        pygame.display.flip()
+        clock.tick(fps)
@@ -1,46 +1,76 @@
-import pygame, sys, random
+import pygame, sys
 from button import Button
+from asset_cache import assets
+from text_cache import fonts, texts
+from hud import Hud
+from render import make_renderer
+from controls import keyboard_input, pointer_input
+from runner import RunnerSim
+from pool import Entity
+from spawns import Pattern, SpawnStream
+from timestep import FixedTimestep, Interpolated, display_fps
+from profiler import profiler
+from replay import recording
+from race import RaceClient, RaceView, race_address
+from leaderboard import Leaderboard, scores_path
+from particles import Effects
+from quality import QualityGovernor, quality_steps
+from animation import PlayerAnimator, animations, sheet
+from loader import AsyncLoader, draw_progress
+from audio import AudioManager
+from scenes import Scene, SceneStack
 
 pygame.init()
 
 WIDTH, HEIGHT = 1280, 720
 FPS = 60
+DISPLAY_FPS = display_fps(default=FPS)
+RACE_SERVER = race_address()
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 RED = (255, 50, 50)
 
 SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+assets.use_pack("assets.pack")
 pygame.display.set_caption("Jurassic Jumpers")
 clock = pygame.time.Clock()
 
-BG = pygame.image.load("assets/Background.png")
-
-pygame.mixer.init()
-pygame.mixer.music.load("assets/menu_music.mp3")
-pygame.mixer.music.set_volume(0.5)
-pygame.mixer.music.play(-1)
-
-# ✅ Load damage sound
-damage_sound = pygame.mixer.Sound("assets/damage_sound.wav")
-damage_sound.set_volume(0.5)
-
-def get_font(size): 
-    return pygame.font.Font("assets/font.ttf", size)
-
-class Player(pygame.sprite.Sprite):
+BG_IMAGE = ("Background.png", None, False, False, False)
+
+# Decoded on loader threads while the menu is already up
+GAME_IMAGES = [
+    "p1_stand.png",
+    "p2_walk04.png",
+    "p1_jump.png",
+    ("jetpack_200x200_transparent.png", (80, 80)),
+    ("flame.png", (40, 50)),
+]
+MENU_MUSIC = "menu_music.mp3"
+GAME_MUSIC = "game_music.mp3"
+DAMAGE_SOUND = "damage_sound.wav"
+loader = AsyncLoader()
+effects = Effects(SCREEN.get_rect())
+audio = AudioManager(loader, music_volume=0.5)
+scenes = SceneStack()
+leaderboard = Leaderboard(scores_path(), "main")
+# Race results are kept apart so they never show up among the solo high scores.
+race_scores = Leaderboard(scores_path(), "main.race")
+
+def get_font(size):
+    return fonts.get("font.ttf", size)
+
+class Player(pygame.sprite.Sprite, Interpolated):
     def __init__(self):
         super().__init__()
 
-        self.animations = {
-            "idle": [pygame.image.load("assets/p1_stand.png")],
-            "run": [pygame.image.load("assets/p2_walk04.png")],
-            "jump": [pygame.image.load("assets/p1_jump.png")],
-            "fly": [pygame.image.load("assets/p1_jump.png")],
-        }
+        self.animator = PlayerAnimator(animations({
+            "idle": sheet("p1_stand.png"),
+            "run": sheet("p2_walk04.png"),
+            "jump": sheet("p1_jump.png"),
+            "fly": sheet("p1_jump.png"),
+        }))
 
-        self.state = "idle"
-        self.anim_index = 0
-        self.image = self.animations[self.state][0]
+        self.image = self.animator.image
         self.rect = self.image.get_rect()
         self.rect.center = (100, HEIGHT // 2)
 
@@ -51,15 +81,13 @@ class Player(pygame.sprite.Sprite):
         self.double_jump = False
         self.used_double_jump = False
 
-        raw_jetpack = pygame.image.load("assets/jetpack_200x200_transparent.png").convert_alpha()
-        self.jetpack_img = pygame.transform.scale(raw_jetpack, (80,80))
-
-        raw_flame = pygame.image.load("assets/flame.png").convert_alpha()
-        self.flame_img = pygame.transform.scale(raw_flame, (40, 50))
+        self.jetpack_img = assets.image("jetpack_200x200_transparent.png", (80, 80))
+        self.flame_img = assets.image("flame.png", (40, 50))
 
         self.jetpack_enabled = False
         self.jetpack_timer = 0  
         self.is_flying = False
+        self.exhaust = None
 
         self.health = 3
         self.max_health = 3
@@ -68,8 +96,9 @@ class Player(pygame.sprite.Sprite):
         self.jetpack_enabled = True
         self.jetpack_timer = duration
 
-    def update(self):
-        keys = pygame.key.get_pressed()
+    def update(self, keys=None):
+        if keys is None:
+            keys = pygame.key.get_pressed()
 
         if keys[pygame.K_j] and not self.jetpack_enabled:
             self.activate_jetpack()
@@ -107,40 +136,32 @@ class Player(pygame.sprite.Sprite):
             if self.jetpack_timer <= 0:
                 self.jetpack_enabled = False
 
-        if self.jetpack_enabled and self.is_flying:
-            self.state = "fly"
-        elif not self.grounded:
-            self.state = "jump"
-        else:
-            self.state = "run" if keys[pygame.K_RIGHT] else "idle"
+        if self.exhaust is not None:
+            self.exhaust.stream(self.rect.left - 5, self.rect.bottom + 25,
+                                self.jetpack_enabled and self.is_flying)
+        self.image = self.animator.update(self, keys, 1 / FPS)
 
-        self.animate()
+    def parts(self, alpha=1.0):
+        left, top = self.lerp_pos(alpha)
+        bottom = top + self.rect.height
+        parts = [(self.jetpack_img, (left - 45, top + 15))]
 
-    def animate(self):
-        frames = self.animations[self.state]
-        self.anim_index += 0.1
-        if self.anim_index >= len(frames):
-            self.anim_index = 0
-        self.image = frames[int(self.anim_index)]
+        if self.jetpack_enabled and self.is_flying:
+            parts.append((self.flame_img, (left - 25, bottom - 25)))
 
-    def draw(self, surface):
-        jetpack_x = self.rect.left - 45
-        jetpack_y = self.rect.top + 15
-        surface.blit(self.jetpack_img, (jetpack_x, jetpack_y))
+        parts.append((self.image, (left, top)))
+        return parts
 
-        if self.jetpack_enabled and self.is_flying:
-            flame_x = self.rect.left - 25
-            flame_y = self.rect.bottom - 25
-            surface.blit(self.flame_img, (flame_x, flame_y))
+    def draw(self, surface, alpha=1.0):
+        for image, pos in self.parts(alpha):
+            surface.blit(image, pos)
 
-        surface.blit(self.image, self.rect)
+class Obstacle(Entity):
+    __slots__ = ()
 
-class Obstacle(pygame.sprite.Sprite):
-    def __init__(self, x):
-        super().__init__()
-        self.image = pygame.Surface((40, 40))
-        self.image.fill(RED)
-        self.rect = self.image.get_rect()
+    def spawn(self, x):
+        self.image = assets.solid((40, 40), RED)
+        self.rect.size = self.image.get_size()
         self.rect.x = x
         self.rect.y = HEIGHT - 60
 
@@ -149,155 +170,316 @@ class Obstacle(pygame.sprite.Sprite):
         if self.rect.right < 0:
             self.kill()
 
-def play():
-    pygame.mixer.music.stop()
-    pygame.mixer.music.load("assets/game_music.mp3")
-    pygame.mixer.music.play(-1)
+# One block every 91 ticks, 0-200px past the right edge.
+PATTERN = Pattern(91, WIDTH, 200, (("block",),))
+OBSTACLE_TYPES = {"block": Obstacle}
 
-    player = Player()
-    obstacle_group = pygame.sprite.Group()
+def new_run(seed=None, collider=None):
+    return RunnerSim(Player(), SpawnStream(seed, PATTERN), OBSTACLE_TYPES, collider)
 
-    obstacle_timer = 0
-    score = 0
-    font = pygame.font.SysFont("Arial", 30)
+class PlayScene(Scene):
+    name = "play"
 
-    running = True
-    while running:
-        clock.tick(FPS)
+    def __init__(self):
+        self.hud = Hud(fonts.sys("Arial", 30), WHITE, [("Score: ", (10, 10)), ("Health: ", (10, 40))])
+        self.renderer = make_renderer(SCREEN, BLACK)
+        self.governor = QualityGovernor(quality_steps(renderer=self.renderer, effects=effects),
+                                        1000 / (DISPLAY_FPS or FPS))
+        self.run = None
+        self.recorder = None
+
+    def enter(self, seed=None):
+        audio.play_music(GAME_MUSIC)
+
+        self.run = new_run(seed)
+        effects.attach(self.run)
+        self.keyboard = keyboard_input()
+        self.recorder = recording(self.run, "main")
+        if self.recorder is not None:
+            self.keyboard = self.recorder.wrap(self.keyboard)
+        self.timestep = FixedTimestep(1 / FPS)
+        clock.tick()
+
+    def exit(self):
+        if self.recorder is not None:
+            self.recorder.save()
+            self.recorder = None
+        self.run = None
+
+    def frame(self, scenes):
+        run = self.run
+        dt = clock.tick(DISPLAY_FPS) / 1000
+        self.governor.frame(clock.get_rawtime())
+        profiler.begin("play")
         for event in pygame.event.get():
+            profiler.handle(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+        audio.update()
+        profiler.mark("input")
+
+        for _ in range(self.timestep.advance(dt)):
+            if run.step(self.keyboard.read()):
+                audio.play_effect(DAMAGE_SOUND)  # ✅ Play sound on damage
+            if run.over:
+                break
+
+        self.hud.set(run.score, run.player.health)
+        profiler.mark("update")
+        self.renderer.draw(run.player, run.obstacles, self.hud, self.timestep.alpha, effects.particles)
+        profiler.end()
+
+        if run.over:
+            leaderboard.submit(run.score, run.seed)
+            scenes.pop()
+
+# An online race against the server given by --race=host:port: the local run is
+# predicted by the RaceClient, the other racers are drawn as ghosts behind the player,
+# and once out the player watches until everyone is.
+class RaceScene(PlayScene):
+    name = "race"
+
+    def enter(self, seed=None):
+        audio.play_music(GAME_MUSIC)
+        self.waiting = texts.render("Waiting for racers...", WHITE, get_font(40))
+        try:
+            self.client = RaceClient(RACE_SERVER, new_run)
+        except OSError as e:
+            print(f"race: could not connect to {RACE_SERVER[0]}:{RACE_SERVER[1]}: {e}")
+            self.client = None
+        self.view = RaceView(self.client)
+        self.run = None
+        self.keyboard = keyboard_input()
+        self.timestep = FixedTimestep(1 / FPS)
+        clock.tick()
+
+    def exit(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.run = None
+
+    def frame(self, scenes):
+        client = self.client
+        dt = clock.tick(DISPLAY_FPS) / 1000
+        self.governor.frame(clock.get_rawtime())
+        profiler.begin("race")
+        for event in pygame.event.get():
+            profiler.handle(event)
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+        audio.update()
+        if client is None:
+            scenes.pop()
+            return
+        client.poll()
+        profiler.mark("input")
+
+        if not client.started:
+            self.timestep.advance(dt)
+            SCREEN.fill(BLACK)
+            SCREEN.blit(self.waiting, self.waiting.get_rect(center=(WIDTH // 2, HEIGHT // 2)))
+            pygame.display.update()
+            profiler.end()
+            if not client.connected:
+                scenes.pop()
+            return
+
+        run = client.run
+        if self.run is not run:
+            self.run = run
+            effects.attach(run)
+        for _ in range(client.steps(self.timestep.advance(dt))):
+            if run.over:
+                break
+            if client.step(self.keyboard.read()):
+                audio.play_effect(DAMAGE_SOUND)
+
+        self.hud.set(run.score, run.player.health)
+        profiler.mark("update")
+        self.renderer.draw(self.view, run.obstacles, self.hud, self.timestep.alpha, effects.particles)
+        profiler.end()
+
+        if client.results is not None or not client.connected:
+            if client.results is not None:
+                scores = sorted(client.results.values(), reverse=True)
+                score = client.results[client.slot]
+                race_scores.submit(score, client.run.seed)
+                print(f"race: scored {score}, place {scores.index(score) + 1} of {len(scores)}, "
+                      f"{client.corrections} corrections")
+            else:
+                print("race: lost the connection to the server")
+            scenes.pop()
+
+class OptionsScene(Scene):
+    name = "options"
 
-        player.update()
-        obstacle_group.update()
-
-        obstacle_timer += 1
-        if obstacle_timer > 90:
-            obstacle = Obstacle(WIDTH + random.randint(0, 200))
-            obstacle_group.add(obstacle)
-            obstacle_timer = 0
-
-        if pygame.sprite.spritecollide(player, obstacle_group, False):
-            damage_sound.play()  # ✅ Play sound on damage
-            player.health -= 1
-            obstacle_group.empty()
-            if player.health <= 0:
-                running = False
-
-        score += 1
-
-        SCREEN.fill(BLACK)
-        player.draw(SCREEN)
-        obstacle_group.draw(SCREEN)
-
-        score_text = font.render(f"Score: {score}", True, WHITE)
-        health_text = font.render(f"Health: {player.health}", True, WHITE)
-        SCREEN.blit(score_text, (10, 10))
-        SCREEN.blit(health_text, (10, 40))
-
-        pygame.display.flip()
-
-    pygame.mixer.music.stop()
-    pygame.mixer.music.load("assets/menu_music.mp3")
-    pygame.mixer.music.play(-1)
-
-    main_menu()
-
-def options():
     slider_x = 440
     slider_y = 300
     slider_width = 400
     slider_height = 10
     handle_radius = 12
-    dragging = False
-
-    volume = pygame.mixer.music.get_volume()
 
-    while True:
-        OPTIONS_MOUSE_POS = pygame.mouse.get_pos()
+    def __init__(self):
+        self.options_text = texts.render("Options", "Black", get_font(45))
+        self.options_rect = self.options_text.get_rect(center=(640, 100))
+        self.options_back = Button(image=None, pos=(640, 500),
+                                   text_input="BACK", font=get_font(50), base_color="Black", hovering_color="Green")
+
+    def enter(self):
+        self.dragging = False
+        self.volume = audio.music_volume
+        self.pointer = pointer_input()
+
+    def frame(self, scenes):
+        slider_x, slider_y = self.slider_x, self.slider_y
+        slider_width, slider_height = self.slider_width, self.slider_height
+        handle_radius = self.handle_radius
+
+        profiler.begin("options")
+        OPTIONS_MOUSE_POS = self.pointer.pos()
         mouse_x, mouse_y = OPTIONS_MOUSE_POS
 
         SCREEN.fill("white")
 
-        OPTIONS_TEXT = get_font(45).render("Options", True, "Black")
-        OPTIONS_RECT = OPTIONS_TEXT.get_rect(center=(640, 100))
-        SCREEN.blit(OPTIONS_TEXT, OPTIONS_RECT)
+        SCREEN.blit(self.options_text, self.options_rect)
 
         pygame.draw.rect(SCREEN, "gray", (slider_x, slider_y, slider_width, slider_height))
-        pygame.draw.rect(SCREEN, "green", (slider_x, slider_y, int(slider_width * volume), slider_height))
+        pygame.draw.rect(SCREEN, "green", (slider_x, slider_y, int(slider_width * self.volume), slider_height))
 
-        handle_x = slider_x + int(slider_width * volume)
+        handle_x = slider_x + int(slider_width * self.volume)
         pygame.draw.circle(SCREEN, "blue", (handle_x, slider_y + slider_height // 2), handle_radius)
 
-        vol_text = get_font(30).render(f"Volume: {int(volume * 100)}%", True, "black")
+        vol_text = texts.render(f"Volume: {int(self.volume * 100)}%", "black", get_font(30))
         SCREEN.blit(vol_text, (slider_x, slider_y - 40))
 
-        OPTIONS_BACK = Button(image=None, pos=(640, 500),
-                              text_input="BACK", font=get_font(50), base_color="Black", hovering_color="Green")
-        OPTIONS_BACK.changeColor(OPTIONS_MOUSE_POS)
-        OPTIONS_BACK.update(SCREEN)
+        self.options_back.changeColor(OPTIONS_MOUSE_POS)
+        self.options_back.update(SCREEN)
+        profiler.mark("draw")
 
         for event in pygame.event.get():
+            profiler.handle(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if OPTIONS_BACK.checkForInput(OPTIONS_MOUSE_POS):
+                if self.options_back.checkForInput(OPTIONS_MOUSE_POS):
+                    scenes.pop()
                     return
                 if abs(mouse_x - handle_x) < handle_radius and abs(mouse_y - (slider_y + slider_height // 2)) < handle_radius:
-                    dragging = True
+                    self.dragging = True
 
             elif event.type == pygame.MOUSEBUTTONUP:
-                dragging = False
+                self.dragging = False
 
-            elif event.type == pygame.MOUSEMOTION and dragging:
+            elif event.type == pygame.MOUSEMOTION and self.dragging:
                 new_volume = (mouse_x - slider_x) / slider_width
-                volume = max(0.0, min(1.0, new_volume))
-                pygame.mixer.music.set_volume(volume)
+                self.volume = max(0.0, min(1.0, new_volume))
+                audio.set_music_volume(self.volume)
+        audio.update()
+        profiler.mark("input")
 
+        profiler.draw_overlay(SCREEN)
         pygame.display.update()
+        profiler.mark("present")
+        profiler.end()
 
-def main_menu():
-    pygame.mixer.music.load("assets/menu_music.mp3")
-    pygame.mixer.music.play(-1)
-
-    while True:
-        SCREEN.blit(BG, (0, 0))
+class MenuScene(Scene):
+    name = "main_menu"
 
-        MENU_MOUSE_POS = pygame.mouse.get_pos()
+    def __init__(self):
+        self.menu_text = texts.render("Jurassic Jumper", "#598006", get_font(75))
+        self.menu_rect = self.menu_text.get_rect(center=(640, 100))
+
+        self.play_button = Button(image=assets.image("Play Rect.png"), pos=(640, 250),
+                                  text_input="PLAY", font=get_font(50), base_color="#d7fcd4", hovering_color="White")
+        self.options_button = Button(image=assets.image("Options Rect.png"), pos=(640, 400),
+                                     text_input="OPTIONS", font=get_font(50), base_color="#d7fcd4", hovering_color="White")
+        self.quit_button = Button(image=assets.image("Quit Rect.png"), pos=(640, 550),
+                                  text_input="QUIT", font=get_font(50), base_color="#d7fcd4", hovering_color="White")
+        self.buttons = [self.play_button, self.options_button, self.quit_button]
+        self.scores = []
+        self.scores_version = None
+
+    def enter(self):
+        leaderboard.start()
+        loader.load([BG_IMAGE] + GAME_IMAGES)
+        audio.preload(music=[MENU_MUSIC, GAME_MUSIC], effects=[(DAMAGE_SOUND, 0.5)])
+        audio.play_music(MENU_MUSIC)
+        self.pointer = pointer_input()
+
+    def resume(self):
+        audio.play_music(MENU_MUSIC)
+
+    def frame(self, scenes):
+        profiler.begin("main_menu")
+        loader.poll()
+        audio.update()
+        background = assets.loaded(*BG_IMAGE)
+        if background is not None:
+            SCREEN.blit(background, (0, 0))
+        else:
+            SCREEN.fill(BLACK)
 
-        MENU_TEXT = get_font(75).render("Jurassic Jumper", True, "#598006")
-        MENU_RECT = MENU_TEXT.get_rect(center=(640, 100))
+        MENU_MOUSE_POS = self.pointer.pos()
 
-        PLAY_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(640, 250),
-                             text_input="PLAY", font=get_font(50), base_color="#d7fcd4", hovering_color="White")
-        OPTIONS_BUTTON = Button(image=pygame.image.load("assets/Options Rect.png"), pos=(640, 400),
-                                text_input="OPTIONS", font=get_font(50), base_color="#d7fcd4", hovering_color="White")
-        QUIT_BUTTON = Button(image=pygame.image.load("assets/Quit Rect.png"), pos=(640, 550),
-                             text_input="QUIT", font=get_font(50), base_color="#d7fcd4", hovering_color="White")
+        SCREEN.blit(self.menu_text, self.menu_rect)
 
-        SCREEN.blit(MENU_TEXT, MENU_RECT)
+        # Re-rendered only when the leaderboard's cache changed.
+        if self.scores_version != leaderboard.version:
+            self.scores_version = leaderboard.version
+            top = leaderboard.top(5)
+            font = get_font(25)
+            self.scores = [texts.render("HIGH SCORES", "#598006", font)] if top else []
+            self.scores += [texts.render(f"{i}. {score}", "#d7fcd4", font) for i, (score, *_) in enumerate(top, 1)]
+        for i, line in enumerate(self.scores):
+            SCREEN.blit(line, (60, 220 + i * 40))
 
-        for button in [PLAY_BUTTON, OPTIONS_BUTTON, QUIT_BUTTON]:
+        for button in self.buttons:
             button.changeColor(MENU_MOUSE_POS)
             button.update(SCREEN)
+        if not loader.finished:
+            draw_progress(SCREEN, loader.progress, (440, 680, 400, 8))
+        profiler.mark("draw")
 
         for event in pygame.event.get():
+            profiler.handle(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
 
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if PLAY_BUTTON.checkForInput(MENU_MOUSE_POS):
-                    play()
-                if OPTIONS_BUTTON.checkForInput(MENU_MOUSE_POS):
-                    options()
-                if QUIT_BUTTON.checkForInput(MENU_MOUSE_POS):
+                if self.play_button.checkForInput(MENU_MOUSE_POS):
+                    scenes.push(RaceScene if RACE_SERVER else PlayScene)
+                    return
+                if self.options_button.checkForInput(MENU_MOUSE_POS):
+                    scenes.push(OptionsScene)
+                    return
+                if self.quit_button.checkForInput(MENU_MOUSE_POS):
                     pygame.quit()
                     sys.exit()
+        profiler.mark("input")
 
+        profiler.draw_overlay(SCREEN)
         pygame.display.update()
+        profiler.mark("present")
+        profiler.end()
+
+# Entry points for each scene on its own (bench.py, replay.py); the game starts at the menu.
+def play(seed=None):
+    scenes.run(PlayScene, seed)
+
+def race():
+    scenes.run(RaceScene)
+
+def options():
+    scenes.run(OptionsScene)
+
+def main_menu():
+    scenes.run(MenuScene)
 
-main_menu()
\ No newline at end of file
+if __name__ == "__main__":
+    main_menu()
\ No newline at end of file
@@ -1,6 +1,24 @@
 import pygame
 import sys
-import random
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from asset_cache import assets
+from text_cache import fonts
+from hud import Hud
+from render import make_renderer
+from controls import keyboard_input
+from runner import RunnerSim
+from pool import Entity
+from spawns import Pattern, SpawnStream
+from timestep import FixedTimestep, Interpolated, display_fps
+from profiler import profiler
+from replay import recording
+from particles import Effects
+from leaderboard import Leaderboard, scores_path
+from quality import QualityGovernor, quality_steps
+from animation import PlayerAnimator, animations, sheet
+from loader import AsyncLoader, loading_screen
 
 # Initialize Pygame
 pygame.init()
@@ -8,31 +26,43 @@ pygame.init()
 # Constants
 WIDTH, HEIGHT = 1280, 720
 FPS = 60
+DISPLAY_FPS = display_fps(default=FPS)
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 RED = (255, 50, 50)
 
 # Setup screen
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
+assets.use_pack("assets/assets.pack")
 pygame.display.set_caption("Cyber Runner")
 clock = pygame.time.Clock()
 
+# Everything a run draws, decoded on loader threads behind the loading screen
+GAME_IMAGES = [
+    "assets/p1_stand.png",
+    "assets/p2_walk04.png",
+    "assets/p1_jump.png",
+    ("assets/jetpack_200x200_transparent.png", (80, 80)),
+    ("assets/flame.png", (40, 50)),
+]
+loader = AsyncLoader()
+effects = Effects(screen.get_rect())
+leaderboard = Leaderboard(scores_path(), "makeshift2")
 
-class Player(pygame.sprite.Sprite):
+
+class Player(pygame.sprite.Sprite, Interpolated):
     def __init__(self):
         super().__init__()
 
         # Animations
-        self.animations = {
-            "idle": [pygame.image.load("assets/p1_stand.png")],
-            "run": [pygame.image.load("assets/p2_walk04.png")],
-            "jump": [pygame.image.load("assets/p1_jump.png")],
-            "fly": [pygame.image.load("assets/p1_jump.png")],
-        }
-
-        self.state = "idle"
-        self.anim_index = 0
-        self.image = self.animations[self.state][0]
+        self.animator = PlayerAnimator(animations({
+            "idle": sheet("assets/p1_stand.png"),
+            "run": sheet("assets/p2_walk04.png"),
+            "jump": sheet("assets/p1_jump.png"),
+            "fly": sheet("assets/p1_jump.png"),
+        }))
+
+        self.image = self.animator.image
         self.rect = self.image.get_rect()
         self.rect.center = (100, HEIGHT // 2)
 
@@ -48,14 +78,13 @@ class Player(pygame.sprite.Sprite):
         self.jetpack_enabled = False
         self.jetpack_timer = 0
         self.is_flying = False
+        self.exhaust = None
 
         # Load and scale jetpack (now BIGGER)
-        raw_jetpack = pygame.image.load("assets/jetpack_200x200_transparent.png").convert_alpha()
-        self.jetpack_img = pygame.transform.scale(raw_jetpack, (80, 80))  
+        self.jetpack_img = assets.image("assets/jetpack_200x200_transparent.png", (80, 80))
 
         # Load and scale flame (now BIGGER)
-        raw_flame = pygame.image.load("assets/flame.png").convert_alpha()
-        self.flame_img = pygame.transform.scale(raw_flame, (40, 50)) 
+        self.flame_img = assets.image("assets/flame.png", (40, 50))
 
         # Stats
         self.health = 3
@@ -65,8 +94,9 @@ class Player(pygame.sprite.Sprite):
         self.jetpack_enabled = True
         self.jetpack_timer = duration
 
-    def update(self):
-        keys = pygame.key.get_pressed()
+    def update(self, keys=None):
+        if keys is None:
+            keys = pygame.key.get_pressed()
 
         # Activate jetpack
         if keys[pygame.K_j] and not self.jetpack_enabled:
@@ -110,45 +140,36 @@ class Player(pygame.sprite.Sprite):
             if self.jetpack_timer <= 0:
                 self.jetpack_enabled = False
 
-        # Animation state
-        if self.jetpack_enabled and self.is_flying:
-            self.state = "fly"
-        elif not self.grounded:
-            self.state = "jump"
-        else:
-            self.state = "run" if keys[pygame.K_RIGHT] else "idle"
+        if self.exhaust is not None:
+            self.exhaust.stream(self.rect.left - 5, self.rect.bottom + 25,
+                                self.jetpack_enabled and self.is_flying)
+        self.image = self.animator.update(self, keys, 1 / FPS)
 
-        self.animate()
+    def parts(self, alpha=1.0):
+        left, top = self.lerp_pos(alpha)
+        bottom = top + self.rect.height
+        # Jetpack behind player (adjusted position)
+        parts = [(self.jetpack_img, (left - 45, top + 15))]
 
-    def animate(self):
-        frames = self.animations[self.state]
-        self.anim_index += 0.1
-        if self.anim_index >= len(frames):
-            self.anim_index = 0
-        self.image = frames[int(self.anim_index)]
+        # Flame (if flying) (adjusted position)
+        if self.jetpack_enabled and self.is_flying:
+            parts.append((self.flame_img, (left - 25, bottom - 25)))
 
-    def draw(self, surface):
-        # Draw jetpack behind player (adjusted position)
-        jetpack_x = self.rect.left - 45
-        jetpack_y = self.rect.top +15
-        surface.blit(self.jetpack_img, (jetpack_x, jetpack_y))
+        # The player itself
+        parts.append((self.image, (left, top)))
+        return parts
 
-        # Draw flame (if flying) (adjusted position)
-        if self.jetpack_enabled and self.is_flying:
-            flame_x = self.rect.left - 25
-            flame_y = self.rect.bottom - 25
-            surface.blit(self.flame_img, (flame_x, flame_y))
+    def draw(self, surface, alpha=1.0):
+        for image, pos in self.parts(alpha):
+            surface.blit(image, pos)
 
-        # Draw the player
-        surface.blit(self.image, self.rect)
 
+class Obstacle(Entity):
+    __slots__ = ()
 
-class Obstacle(pygame.sprite.Sprite):
-    def __init__(self, x):
-        super().__init__()
-        self.image = pygame.Surface((40, 40))
-        self.image.fill(RED)
-        self.rect = self.image.get_rect()
+    def spawn(self, x):
+        self.image = assets.solid((40, 40), RED)
+        self.rect.size = self.image.get_size()
         self.rect.x = x
         self.rect.y = HEIGHT - 60
 
@@ -158,57 +179,64 @@ class Obstacle(pygame.sprite.Sprite):
             self.kill()
 
 
-def main():
-    player = Player()
-    obstacle_group = pygame.sprite.Group()
+# One block every 91 ticks, 0-200px past the right edge.
+PATTERN = Pattern(91, WIDTH, 200, (("block",),))
+OBSTACLE_TYPES = {"block": Obstacle}
+
+
+def new_run(seed=None, collider=None):
+    return RunnerSim(Player(), SpawnStream(seed, PATTERN), OBSTACLE_TYPES, collider)
 
-    obstacle_timer = 0
-    score = 0
-    font = pygame.font.SysFont("Arial", 30)
+
+def main(seed=None):
+    leaderboard.start()
+    loader.load(GAME_IMAGES)
+    loading_screen(screen, loader, clock)
+
+    run = new_run(seed)
+    effects.attach(run)
+    keyboard = keyboard_input()
+    recorder = recording(run, "makeshift2")
+    if recorder is not None:
+        keyboard = recorder.wrap(keyboard)
+    hud = Hud(fonts.sys("Arial", 30), WHITE, [("Score: ", (10, 10)), ("Health: ", (10, 40))])
+    renderer = make_renderer(screen, BLACK)
+    governor = QualityGovernor(quality_steps(renderer=renderer, effects=effects), 1000 / (DISPLAY_FPS or FPS))
+    timestep = FixedTimestep(1 / FPS)
 
     running = True
-    while running:
-        clock.tick(FPS)
+    clock.tick()
+    while running and not run.over:
+        dt = clock.tick(DISPLAY_FPS) / 1000
+        governor.frame(clock.get_rawtime())
+        profiler.begin("makeshift2")
         for event in pygame.event.get():
+            profiler.handle(event)
             if event.type == pygame.QUIT:
                 running = False
+        profiler.mark("input")
 
-        player.update()
-        obstacle_group.update()
-
-        # Spawn obstacles
-        obstacle_timer += 1
-        if obstacle_timer > 90:
-            obstacle = Obstacle(WIDTH + random.randint(0, 200))
-            obstacle_group.add(obstacle)
-            obstacle_timer = 0
-
-        # Collision detection
-        if pygame.sprite.spritecollide(player, obstacle_group, False):
-            player.health -= 1
-            obstacle_group.empty()
-            if player.health <= 0:
-                running = False
-
-        # Score
-        score += 1
-
-        # Draw
-        screen.fill(BLACK)
-        player.draw(screen)
-        obstacle_group.draw(screen)
+        # Movement, spawning, collisions and score at a fixed rate
+        for _ in range(timestep.advance(dt)):
+            run.step(keyboard.read())
+            if run.over:
+                break
 
-        # UI
-        score_text = font.render(f"Score: {score}", True, WHITE)
-        health_text = font.render(f"Health: {player.health}", True, WHITE)
-        screen.blit(score_text, (10, 10))
-        screen.blit(health_text, (10, 40))
+        # Draw, interpolated between the last two ticks
+        hud.set(run.score, run.player.health)
+        profiler.mark("update")
+        renderer.draw(run.player, run.obstacles, hud, timestep.alpha, effects.particles)
+        profiler.end()
 
-        pygame.display.flip()
-
-    pygame.quit()
-    sys.exit()
+    if recorder is not None:
+        recorder.save()
+    if run.over:
+        leaderboard.submit(run.score, run.seed)
+        best = leaderboard.top(1)[0][0]
+        print(f"scores: {run.score}, best {best}")
 
 
 if __name__ == "__main__":
     main()
+    pygame.quit()
+    sys.exit()
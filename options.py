@@ -0,0 +1,20 @@
+import os
+import sys
+
+
+# The value of --name=value on the command line, else of the environment variable env,
+# else default. A later --name= wins over an earlier one.
+def option(name, env, argv=None, default=None):
+    argv = sys.argv[1:] if argv is None else argv
+    value = os.environ.get(env, default)
+    prefix = f"--{name}="
+    for arg in argv:
+        if arg.startswith(prefix):
+            value = arg[len(prefix):]
+    return value
+
+
+# True for a bare --name on the command line, or env set to anything but "" or "0".
+def flag(name, env, argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    return f"--{name}" in argv or os.environ.get(env, "") not in ("", "0")
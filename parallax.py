@@ -0,0 +1,124 @@
+import time
+
+from asset_cache import assets
+
+
+class ParallaxLayer:
+    def __init__(self, images, speed, y=0):
+        # One image per background theme, or a single image shared by every theme.
+        self.images = images
+        self.speed = speed
+        self.y = y
+        self.width = images[0].get_width()
+        self.scroll_x = 0.0
+        self.prev_scroll_x = 0.0
+
+    def image(self, index):
+        if len(self.images) == 1:
+            return self.images[0]
+        return self.images[index]
+
+    def update(self):
+        self.prev_scroll_x = self.scroll_x
+        self.scroll_x -= self.speed
+        if self.scroll_x <= -self.width:
+            self.scroll_x += self.width
+
+    def offset(self, t):
+        # Interpolates between the last two scroll positions, except across a wrap.
+        if self.scroll_x > self.prev_scroll_x:
+            return self.scroll_x
+        return self.prev_scroll_x + (self.scroll_x - self.prev_scroll_x) * t
+
+    def draw(self, surface, image, alpha=None, t=1.0):
+        # Blits straight from the cached surface. The fade uses the surface-wide alpha,
+        # which is restored right after so the shared surface is left as it was found.
+        if alpha is not None:
+            image.set_alpha(alpha)
+        x = int(self.offset(t))
+        right = surface.get_width()
+        blits = 0
+        while x < right:
+            surface.blit(image, (x, self.y))
+            x += self.width
+            blits += 1
+        if alpha is not None:
+            image.set_alpha(None)
+        return blits
+
+
+class ParallaxBackground:
+    def __init__(self, image_paths, size, scroll_speed=1, layers=()):
+        self.layers = [ParallaxLayer([assets.image(path, size, alpha=False) for path in image_paths], scroll_speed)]
+        for paths, speed, layer_size in layers:
+            self.add_layer(paths, speed, layer_size)
+
+        self.themes = len(image_paths)
+        self.index = 0
+        self.next_index = 0
+        self.alpha = 255
+        self.fading = False
+        self.fade_speed = 5
+        self.crossfade = True
+        # Only the first max_layers layers are drawn; all of them keep scrolling.
+        self.max_layers = None
+
+        self.draw_ms = 0.0
+        self.avg_draw_ms = 0.0
+        self.blits = 0
+
+    def add_layer(self, paths, speed, size):
+        if isinstance(paths, str):
+            paths = [paths]
+        self.layers.append(ParallaxLayer([assets.image(path, size) for path in paths], speed))
+
+    def update(self):
+        for layer in self.layers:
+            layer.update()
+
+        if self.fading:
+            self.alpha -= self.fade_speed
+            if self.alpha <= 0:
+                self.alpha = 255
+                self.fading = False
+                self.index = self.next_index
+
+    def draw(self, surface, t=1.0):
+        start = time.perf_counter()
+        blits = 0
+        for layer in self.layers[:self.max_layers]:
+            current = layer.image(self.index)
+            blits += layer.draw(surface, current, t=t)
+            if self.fading:
+                upcoming = layer.image(self.next_index)
+                if upcoming is not current:
+                    blits += layer.draw(surface, upcoming, 255 - self.alpha, t)
+
+        self.blits = blits
+        self.draw_ms = (time.perf_counter() - start) * 1000
+        self.avg_draw_ms += (self.draw_ms - self.avg_draw_ms) * 0.05
+
+    def set_background(self, index):
+        if 0 <= index < self.themes and index != self.index:
+            self.next_index = index
+            self.fading = True
+            self.alpha = 255
+            if not self.crossfade:
+                self.fading = False
+                self.index = index
+
+    # Without the crossfade a theme change is a cut, and one in progress finishes now.
+    def set_crossfade(self, on):
+        self.crossfade = on
+        if not on and self.fading:
+            self.fading = False
+            self.alpha = 255
+            self.index = self.next_index
+
+    def stats(self):
+        return {
+            "draw_ms": self.draw_ms,
+            "avg_draw_ms": self.avg_draw_ms,
+            "blits": self.blits,
+            "layers": len(self.layers[:self.max_layers]),
+        }
@@ -0,0 +1,193 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pygame
+
+from entities import EntityStore
+
+# Textures per fade ramp: a particle steps through them as it ages.
+RAMP_STEPS = 16
+
+
+# A soft disc of `size` pixels tinted from color to end_color while its alpha fades
+# out, pre-rendered as RAMP_STEPS converted surfaces so drawing a particle at any age
+# is a plain blit.
+def fade_ramp(size, color, end_color=None, alpha=255):
+    end_color = color if end_color is None else end_color
+    c = (size - 1) / 2
+    yy, xx = np.mgrid[0:size, 0:size]
+    falloff = np.clip(1.0 - np.hypot(xx - c, yy - c) / (size / 2), 0.0, 1.0)
+    frames = []
+    for i in range(RAMP_STEPS):
+        t = i / (RAMP_STEPS - 1)
+        surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        surface.fill([round(a + (b - a) * t) for a, b in zip(color, end_color)])
+        pixels = pygame.surfarray.pixels_alpha(surface)
+        pixels[:] = (falloff * (alpha * (1.0 - t))).astype(np.uint8)
+        del pixels
+        frames.append(surface.convert_alpha())
+    return frames
+
+
+# Fixed-capacity EntityStore for particles: on top of the store's fields each one
+# has its own gravity, its starting lifetime and the first sprite id (base) of its fade
+# ramp. Particles past capacity are dropped rather than growing the arrays.
+class ParticleSystem(EntityStore):
+    FIELDS = {**EntityStore.FIELDS, "ay": np.float64, "start": np.int32, "base": np.int32}
+
+    def __init__(self, capacity=8192, bounds=None):
+        super().__init__(capacity, bounds)
+        self.ramps = {}
+        self.dropped = 0
+        # Fraction of what emitters ask for that is actually emitted.
+        self.density = 1.0
+
+    # Registers (once) the textures for a ramp and returns its first sprite id.
+    def ramp(self, size, color, end_color=None, alpha=255):
+        key = (size, tuple(color), tuple(end_color) if end_color is not None else None, alpha)
+        first = self.ramps.get(key)
+        if first is None:
+            first = len(self.images)
+            for image in fade_ramp(size, color, end_color, alpha):
+                self.add_sprite(image)
+            self.ramps[key] = first
+        return first
+
+    # Like spawn(), with (x, y) the particle centre and a ramp instead of a sprite.
+    def emit(self, x, y, vx, vy, life, ramp, ay=0.0):
+        n = np.broadcast(x, y, vx, vy, life).size
+        room = self.capacity - self.count
+        if n > room:
+            self.dropped += n - room
+            if not room:
+                return
+            x, y, vx, vy, life = (np.broadcast_to(a, n)[:room] for a in (x, y, vx, vy, life))
+        half = self.sizes[ramp, 0] / 2
+        new = self.spawn(x - half, y - half, vx, vy, life, ramp)
+        self.ay[new] = ay
+        self.start[new] = self.life[new]
+        self.base[new] = ramp
+
+    def update(self):
+        n = self.count
+        self.vy[:n] += self.ay[:n]
+        removed = super().update()
+        n = self.count
+        age = (self.start[:n] - self.life[:n]) * RAMP_STEPS // self.start[:n]
+        np.minimum(age, RAMP_STEPS - 1, out=age)
+        self.sprite[:n] = self.base[:n] + age
+        return removed
+
+
+# Emits particles into a system from a point: either a burst of `count`, or a steady
+# `rate` per tick while stream() is called with on=True. Directions are `angle`
+# radians (screen coordinates, so pi / 2 is down) give or take `spread`.
+class Emitter:
+    def __init__(self, system, ramp, rate=0.0, speed=(1.0, 3.0), angle=0.0, spread=math.pi,
+                 life=(20, 40), gravity=0.0, jitter=0.0, seed=None):
+        self.system = system
+        self.ramp = ramp
+        self.rate = rate
+        self.speed = speed
+        self.angle = angle
+        self.spread = spread
+        self.life = life
+        self.gravity = gravity
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+        self.carry = 0.0
+
+    def emit(self, x, y, count):
+        rng = self.rng
+        density = self.system.density
+        if density < 1.0:
+            count = int(count * density + rng.random())
+            if not count:
+                return
+        angle = self.angle + rng.uniform(-self.spread, self.spread, count)
+        speed = rng.uniform(*self.speed, count)
+        if self.jitter:
+            x = x + rng.uniform(-self.jitter, self.jitter, count)
+            y = y + rng.uniform(-self.jitter, self.jitter, count)
+        self.system.emit(x, y, np.cos(angle) * speed, np.sin(angle) * speed,
+                         rng.integers(self.life[0], self.life[1] + 1, count), self.ramp, self.gravity)
+
+    def stream(self, x, y, on=True):
+        if not on:
+            self.carry = 0.0
+            return
+        self.carry += self.rate
+        count = int(self.carry)
+        if count:
+            self.carry -= count
+            self.emit(x, y, count)
+
+
+# The game's particle effects: jetpack exhaust and sparks where the player hits an
+# obstacle. attach() hooks them into a RunnerSim, which then advances them every tick
+# and calls hit() from its collision check; runs without effects (headless, replays)
+# never touch them.
+class Effects:
+    def __init__(self, bounds, capacity=8192):
+        self.particles = ParticleSystem(capacity, bounds)
+        self.exhaust = Emitter(self.particles, self.particles.ramp(10, (255, 220, 120), (200, 40, 20)),
+                               rate=6, speed=(2.0, 4.0), angle=math.pi / 2 + 0.6, spread=0.35,
+                               life=(18, 34), gravity=-0.05, jitter=3)
+        self.sparks = Emitter(self.particles, self.particles.ramp(6, (255, 255, 200), (255, 120, 0)),
+                              speed=(2.0, 8.0), life=(20, 45), gravity=0.3)
+
+    def attach(self, run):
+        self.particles.clear()
+        run.effects = self
+        run.player.exhaust = self.exhaust
+
+    def hit(self, player, obstacle):
+        x, y = player.rect.clip(obstacle.rect).center
+        self.sparks.emit(x, y, 80)
+
+    def update(self):
+        self.particles.update()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the particle system at a steady particle count.")
+    parser.add_argument("--count", type=int, action="append", help="particles to hold, may be repeated")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--headless", action="store_true", help="use the dummy video driver")
+    args = parser.parse_args(argv)
+
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.init()
+    screen = pygame.display.set_mode((1280, 720))
+    effects = Effects(screen.get_rect(), capacity=max(args.count or [10_000]))
+
+    for count in args.count or (2500, 5000, 10_000):
+        effects.particles.clear()
+        update = draw = 0.0
+        for frame in range(args.frames):
+            start = time.perf_counter()
+            effects.exhaust.stream(640, 200)
+            effects.sparks.emit(640, 360, max(count - len(effects.particles), 0))
+            effects.update()
+            mid = time.perf_counter()
+            screen.fill((0, 0, 0))
+            effects.particles.draw(screen)
+            pygame.display.flip()
+            end = time.perf_counter()
+            if frame >= args.frames // 2:
+                update += mid - start
+                draw += end - mid
+        frames = args.frames - args.frames // 2
+        print(f"{len(effects.particles):6} particles: update={update / frames * 1000:.2f} ms "
+              f"draw={draw / frames * 1000:.2f} ms per frame")
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import pygame
+
+from timestep import Interpolated
+
+
+# Compact stand-in for pygame.sprite.Sprite: a pooled entity only ever belongs to one
+# ObstacleGroup, so it needs no per-instance group set or __dict__. Subclasses set up
+# image and rect in spawn(), which runs both on construction and on reuse.
+class Entity(Interpolated):
+    __slots__ = ("image", "rect", "prev_pos", "group")
+
+    def __init__(self, *args):
+        self.image = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.prev_pos = None
+        self.group = None
+        self.spawn(*args)
+
+    def spawn(self, *args):
+        pass
+
+    def update(self):
+        pass
+
+    def alive(self):
+        return self.group is not None
+
+    def kill(self):
+        group = self.group
+        if group is not None:
+            self.group = None
+            group.dead += 1
+
+
+class Pool:
+    def __init__(self):
+        self.free = {}
+        self.allocated = 0
+        self.reused = 0
+        self.released = 0
+
+    def acquire(self, cls, *args):
+        free = self.free.get(cls)
+        if free:
+            entity = free.pop()
+            entity.spawn(*args)
+            self.reused += 1
+        else:
+            entity = cls(*args)
+            self.allocated += 1
+        return entity
+
+    def release(self, entity):
+        self.free.setdefault(type(entity), []).append(entity)
+        self.released += 1
+
+    def reserve(self, cls, count, *args):
+        free = self.free.setdefault(cls, [])
+        while len(free) < count:
+            free.append(cls(*args))
+            self.allocated += 1
+
+    def stats(self):
+        return {
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "released": self.released,
+            "free": sum(len(free) for free in self.free.values()),
+        }
+
+
+obstacle_pool = Pool()
+
+
+# Drop-in for the pygame.sprite.Group the loops used for obstacles. Killed entities
+# are compacted out in place and handed back to the pool at the end of update(), so
+# an entity can never be reused while a stale reference to it is still listed.
+class ObstacleGroup:
+    def __init__(self, pool=obstacle_pool):
+        self.pool = pool
+        self.entities = []
+        self.dead = 0
+
+    def add(self, entity):
+        entity.group = self
+        self.entities.append(entity)
+
+    def update(self):
+        for entity in self.entities:
+            entity.update()
+        if self.dead:
+            self._compact()
+
+    def _compact(self):
+        entities = self.entities
+        release = self.pool.release
+        j = 0
+        for entity in entities:
+            if entity.group is self:
+                entities[j] = entity
+                j += 1
+            else:
+                release(entity)
+        del entities[j:]
+        self.dead = 0
+
+    def empty(self):
+        release = self.pool.release
+        for entity in self.entities:
+            if entity.group is self:
+                entity.group = None
+            release(entity)
+        self.entities.clear()
+        self.dead = 0
+
+    def sprites(self):
+        return list(self.entities)
+
+    def draw(self, surface):
+        surface.blits([(entity.image, entity.rect) for entity in self.entities], False)
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity):
+        return entity.group is self
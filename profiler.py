@@ -0,0 +1,269 @@
+import json
+import os
+import time
+
+import pygame
+
+from options import flag
+
+PHASES = ("input", "update", "spawn", "collision", "background", "draw", "present")
+PHASE_COLORS = {
+    "input": (120, 120, 120),
+    "update": (70, 160, 255),
+    "spawn": (160, 90, 255),
+    "collision": (255, 80, 80),
+    "background": (80, 200, 120),
+    "draw": (255, 200, 60),
+    "present": (255, 255, 255),
+}
+OVERLAY_KEY = pygame.K_F3
+TRACE_KEY = pygame.K_F4
+
+
+# --profile on the command line or PROFILE=1 records from the start, so a trace can be
+# dumped right after a stutter; otherwise recording starts with the overlay hotkey.
+def profiling(argv=None):
+    return flag("profile", "PROFILE", argv)
+
+
+class CaptureDone(Exception):
+    pass
+
+
+# Splits each frame into phases. The loops call begin() at the top of a frame, mark()
+# after each phase (the time since the previous mark is charged to that phase) and
+# end() once the frame is on screen. All of it is a no-op while disabled.
+#
+# Frames and the individual marks go into rings that are overwritten oldest first. A
+# ring about to overwrite something younger than trace_seconds doubles instead, so it
+# always holds at least that much history whatever the frame rate; after that,
+# recording doesn't allocate.
+class Profiler:
+    def __init__(self, enabled=False, size=1200, marks_per_frame=16, trace_seconds=10):
+        self.enabled = enabled
+        self.trace_seconds = trace_seconds
+        self.scene = None
+        self.start = None
+        self.last = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+        self.size = size
+        self.count = 0
+        self.frame_scene = [None] * size
+        self.frame_start = [0.0] * size
+        self.frame_total = [0.0] * size
+        self.frame_phases = {phase: [0.0] * size for phase in PHASES}
+
+        self.mark_size = size * marks_per_frame
+        self.mark_count = 0
+        self.mark_phase = [None] * self.mark_size
+        self.mark_start = [0.0] * self.mark_size
+        self.mark_time = [0.0] * self.mark_size
+
+        self.overlay = None
+        self.captured = []
+        self.watch = None
+        self.limit = None
+
+    # Records `frames` frames of `scene` into `captured`; CaptureDone is raised once
+    # they are in, or as soon as the game moves on to another scene.
+    def capture(self, scene, frames):
+        self.enabled = True
+        self.watch = scene
+        self.limit = len(self.captured) + frames
+
+    def stop(self):
+        self.enabled = False
+        self.watch = None
+        self.limit = None
+        self.start = None
+
+    def begin(self, scene):
+        if not self.enabled:
+            return
+        if self.watch is not None and scene != self.watch:
+            raise CaptureDone(scene)
+        self.scene = scene
+        self.start = self.last = time.perf_counter()
+        for phase in self.phases:
+            self.phases[phase] = 0.0
+
+    def mark(self, phase):
+        if not self.enabled or self.start is None:
+            return
+        now = time.perf_counter()
+        last = self.last
+        self.phases[phase] += now - last
+        i = self.mark_count % self.mark_size
+        if self.mark_count >= self.mark_size and self.mark_start[i] > now - self.trace_seconds:
+            self._grow_marks()
+            i = self.mark_count % self.mark_size
+        self.mark_phase[i] = phase
+        self.mark_start[i] = last
+        self.mark_time[i] = now - last
+        self.mark_count += 1
+        self.last = now
+
+    def end(self):
+        if not self.enabled or self.start is None:
+            return
+        total = time.perf_counter() - self.start
+        i = self.count % self.size
+        if self.count >= self.size and self.frame_start[i] > self.start - self.trace_seconds:
+            self._grow_frames()
+            i = self.count % self.size
+        self.frame_scene[i] = self.scene
+        self.frame_start[i] = self.start
+        self.frame_total[i] = total
+        for phase, seconds in self.phases.items():
+            self.frame_phases[phase][i] = seconds
+        self.count += 1
+        self.start = None
+
+        if self.overlay is not None:
+            self.overlay.push(total, self.phases)
+        if self.watch is not None:
+            self.captured.append((self.scene, total, dict(self.phases)))
+            if len(self.captured) >= self.limit:
+                raise CaptureDone(self.scene)
+
+    # Doubles a ring, moving each entry to where its sequence number falls in the new size.
+    @staticmethod
+    def _grow(rings, count, size):
+        held = range(max(count - size, 0), count)
+        for ring in rings:
+            old = list(ring)
+            ring.extend(old)
+            for n in held:
+                ring[n % (size * 2)] = old[n % size]
+
+    def _grow_frames(self):
+        rings = [self.frame_scene, self.frame_start, self.frame_total, *self.frame_phases.values()]
+        self._grow(rings, self.count, self.size)
+        self.size *= 2
+
+    def _grow_marks(self):
+        self._grow([self.mark_phase, self.mark_start, self.mark_time], self.mark_count, self.mark_size)
+        self.mark_size *= 2
+
+    # Oldest to newest ring indices of the frames still held.
+    def _frames(self):
+        count = min(self.count, self.size)
+        first = self.count - count
+        return [(first + n) % self.size for n in range(count)]
+
+    def recent(self, seconds=None):
+        frames = self._frames()
+        if seconds is not None and frames:
+            since = self.frame_start[frames[-1]] - seconds
+            frames = [i for i in frames if self.frame_start[i] >= since]
+        return [(self.frame_scene[i], self.frame_total[i],
+                 {phase: times[i] for phase, times in self.frame_phases.items()}) for i in frames]
+
+    # The last `seconds` of frames and their phases in the Chrome trace event format,
+    # for chrome://tracing or https://ui.perfetto.dev.
+    def trace(self, seconds=None):
+        frames = self._frames()
+        if not frames:
+            return {"traceEvents": []}
+        since = self.frame_start[frames[-1]] - (self.trace_seconds if seconds is None else seconds)
+        origin = None
+        events = []
+        for i in frames:
+            if self.frame_start[i] < since:
+                continue
+            if origin is None:
+                origin = self.frame_start[i]
+            events.append({"name": "frame", "cat": self.frame_scene[i], "ph": "X", "pid": 0, "tid": 0,
+                           "ts": (self.frame_start[i] - origin) * 1e6, "dur": self.frame_total[i] * 1e6})
+
+        count = min(self.mark_count, self.mark_size)
+        for n in range(self.mark_count - count, self.mark_count):
+            i = n % self.mark_size
+            if self.mark_start[i] < origin:
+                continue
+            events.append({"name": self.mark_phase[i], "cat": "phase", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": (self.mark_start[i] - origin) * 1e6, "dur": self.mark_time[i] * 1e6})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path=None, seconds=None):
+        if path is None:
+            path = time.strftime("trace-%Y%m%d-%H%M%S.json")
+        with open(path, "w") as f:
+            json.dump(self.trace(seconds), f)
+        print(f"profiler: wrote {os.path.abspath(path)}")
+        return path
+
+    # Hotkeys, called from each loop's event handling: F3 toggles the frame-time graph
+    # (and recording with it), F4 dumps the last trace_seconds as a trace file.
+    def handle(self, event):
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == OVERLAY_KEY:
+            if self.overlay is None:
+                self.overlay = FrameGraph()
+                self.enabled = True
+            else:
+                self.overlay = None
+                self.enabled = self.watch is not None or profiling()
+            return True
+        if event.key == TRACE_KEY:
+            self.dump()
+            return True
+        return False
+
+    def draw_overlay(self, surface):
+        if self.overlay is None:
+            return None
+        return self.overlay.draw(surface)
+
+
+# Frame-time graph drawn in the top right corner. Each frame scrolls the graph one
+# column to the left and paints only the newest bar, stacked by phase, so drawing it
+# costs the same however much history it shows.
+class FrameGraph:
+    def __init__(self, width=300, height=120, scale_ms=33.3, bar=2):
+        self.width = width
+        self.height = height
+        self.scale = height / (scale_ms / 1000)
+        self.bar = bar
+        self.graph = pygame.Surface((width, height))
+        self.graph.fill((20, 20, 20))
+        self.font = pygame.font.Font(None, 20)
+        self.label = None
+        self.totals = []
+        self.rect = pygame.Rect(0, 0, width, height + 20)
+
+    def push(self, total, phases):
+        graph = self.graph
+        graph.scroll(-self.bar, 0)
+        x = self.width - self.bar
+        graph.fill((20, 20, 20), (x, 0, self.bar, self.height))
+
+        y = self.height
+        for phase in PHASES:
+            h = phases[phase] * self.scale
+            if h >= 0.5:
+                graph.fill(PHASE_COLORS[phase], (x, round(y - h), self.bar, round(h)))
+                y -= h
+        for ms in (16.7, 33.3):
+            graph.fill((90, 90, 90), (x, round(self.height - ms / 1000 * self.scale), self.bar, 1))
+
+        self.totals.append(total)
+        if len(self.totals) >= 30:
+            mean = sum(self.totals) / len(self.totals) * 1000
+            worst = max(self.totals) * 1000
+            self.label = self.font.render(f"frame {mean:.2f} ms avg  {worst:.2f} ms max", True,
+                                          (255, 255, 255), (20, 20, 20))
+            self.totals.clear()
+
+    def draw(self, surface):
+        self.rect.topright = (surface.get_width() - 10, 10)
+        surface.blit(self.graph, self.rect.topleft)
+        surface.fill((20, 20, 20), (self.rect.x, self.rect.y + self.height, self.width, 20))
+        if self.label is not None:
+            surface.blit(self.label, (self.rect.x + 4, self.rect.y + self.height + 3))
+        return self.rect
+
+
+profiler = Profiler(enabled=profiling())
@@ -0,0 +1,120 @@
+from collections import deque
+from functools import partial
+
+from options import option
+
+QUALITY_MODES = ("auto", "fixed")
+
+
+# --quality=fixed on the command line (or QUALITY=fixed) keeps every setting where it started.
+def quality_mode(argv=None, default="auto"):
+    mode = option("quality", "QUALITY", argv, default)
+    if mode not in QUALITY_MODES:
+        raise ValueError(f"unknown quality mode {mode!r}, expected one of {QUALITY_MODES}")
+    return mode
+
+
+# One notch of quality: `apply(low)` steps it down, `apply(high)` restores it.
+class QualityStep:
+    __slots__ = ("name", "apply", "low", "high")
+
+    def __init__(self, name, apply, low, high):
+        self.name = name
+        self.apply = apply
+        self.low = low
+        self.high = high
+
+
+# The steps a game loop can give up, cheapest loss first: the parallax crossfade, the
+# extra parallax layers, internal resolution, then particle effects. Steps for things
+# the loop doesn't have, or that are already at or below the step, are left out.
+def quality_steps(background=None, renderer=None, effects=None, scales=(0.75, 0.5)):
+    steps = []
+    if background is not None and hasattr(background, "crossfade"):
+        if background.crossfade:
+            steps.append(QualityStep("parallax crossfade off", background.set_crossfade, False, True))
+        if len(background.layers) > 1:
+            steps.append(QualityStep("parallax layers 1", partial(setattr, background, "max_layers"),
+                                     1, background.max_layers))
+    if renderer is not None and hasattr(renderer, "set_scale"):
+        high = renderer.scale
+        for scale in scales:
+            if scale < high:
+                steps.append(QualityStep(f"render scale {scale}", renderer.set_scale, scale, high))
+                high = scale
+    if effects is not None:
+        particles = effects.particles
+        high = particles.density
+        for density in (0.5, 0.0):
+            if density < high:
+                steps.append(QualityStep(f"effects {density:.0%}", partial(setattr, particles, "density"),
+                                         density, high))
+                high = density
+    return steps
+
+
+# Holds a frame budget by trading quality for time. It is fed the time each frame
+# took to produce (clock.get_rawtime(), which leaves out the frame cap's sleep) and
+# looks at the last `window` frames: when the 90th percentile is over budget it gives
+# up the next step, when it has stayed under `headroom` of the budget for a while it
+# takes the last one back. The measurements start over after every change, and taking
+# a step back waits four times longer each time it had to be given up again soon after,
+# so a machine right at the edge settles instead of flipping every few seconds.
+class QualityGovernor:
+    def __init__(self, steps, budget_ms=1000 / 60, window=90, headroom=0.6, up_after=240,
+                 enabled=None, log=print):
+        self.steps = steps
+        self.budget_ms = budget_ms
+        self.window = window
+        self.headroom = headroom
+        self.up_after = up_after
+        self.enabled = quality_mode() == "auto" if enabled is None else enabled
+        self.log = log
+        self.times = deque(maxlen=window)
+        self.level = 0
+        self.frames = 0
+        self.since_change = 0
+        self.delays = [up_after] * len(steps)
+        self.raised_at = None
+        self.changes = []
+
+    # The steps currently given up, as names.
+    @property
+    def lowered(self):
+        return [step.name for step in self.steps[:self.level]]
+
+    def frame(self, ms):
+        if not self.enabled or not self.steps:
+            return
+        self.frames += 1
+        self.since_change += 1
+        times = self.times
+        times.append(ms)
+        if len(times) < self.window:
+            return
+        p90 = sorted(times)[int(len(times) * 0.9)]
+        if p90 > self.budget_ms and self.level < len(self.steps):
+            # Given up again soon after being restored: wait four times as long next time.
+            if self.raised_at is not None and self.frames - self.raised_at < self.delays[self.level] * 2:
+                self.delays[self.level] *= 4
+            self._change(self.level + 1, p90)
+        elif (p90 < self.budget_ms * self.headroom and self.level
+              and self.since_change >= self.delays[self.level - 1]):
+            self._change(self.level - 1, p90)
+            self.raised_at = self.frames
+
+    def _change(self, level, p90):
+        if level > self.level:
+            step = self.steps[self.level]
+            step.apply(step.low)
+            action = "lowered"
+        else:
+            step = self.steps[level]
+            step.apply(step.high)
+            action = "raised"
+        self.level = level
+        self.since_change = 0
+        self.times.clear()
+        self.changes.append((self.frames, action, step.name, p90))
+        self.log(f"quality: {action} ({step.name}) at p90 {p90:.1f} ms of {self.budget_ms:.1f} ms, "
+                 f"level {level}/{len(self.steps)}: {', '.join(self.lowered) or 'full quality'}")
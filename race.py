@@ -0,0 +1,772 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import struct
+import sys
+import time
+from collections import deque
+
+from options import option
+from replay import KEYS_FOR_BITS, key_bits, restore, snapshot
+
+DEFAULT_PORT = 7777
+TICK_RATE = 60
+LEAD_TICKS = 3
+
+# Every message is a u16 length and a payload whose first byte is its type.
+FRAME = struct.Struct("<H")
+MSG_JOIN, MSG_START, MSG_INPUT, MSG_STATE, MSG_RESULT, MSG_STATS = range(1, 7)
+JOIN = struct.Struct("<B")
+START = struct.Struct("<BIBBB")   # seed, your slot, players, lead ticks
+INPUT = struct.Struct("<BIB")     # tick the keys are for, key bits as in replay.py
+STATE = struct.Struct("<BIB")     # tick, entries; each entry is ENTRY then the fields in its mask
+ENTRY = struct.Struct("<BB")      # slot, mask of the fields that changed
+RESULT = struct.Struct("<BB")     # players, then SCORE for each
+SCORE = struct.Struct("<BI")      # slot, score
+# The payload size of the messages that always have the same one.
+SIZES = {MSG_JOIN: JOIN.size, MSG_START: START.size, MSG_INPUT: INPUT.size}
+
+# A player's state on the wire: y, velocity_y, jetpack_timer, flags, health, and the
+# key bits the server applied on that tick.
+FIELDS = (struct.Struct("<h"), struct.Struct("<d"), struct.Struct("<H"), struct.Struct("<B"), struct.Struct("<B"),
+          struct.Struct("<B"))
+FLAG_NAMES = ("grounded", "used_double_jump", "jetpack_enabled", "is_flying")
+FLAGS = {name: 1 << i for i, name in enumerate(FLAG_NAMES)}
+FLAG_OVER = 1 << len(FLAG_NAMES)
+
+
+# --race=127.0.0.1:7777 on the command line (or RACE_SERVER) plays online against that server.
+def race_address(argv=None):
+    address = option("race", "RACE_SERVER", argv)
+    if not address:
+        return None
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port or DEFAULT_PORT))
+
+
+def frame(payload):
+    return FRAME.pack(len(payload)) + payload
+
+
+# The payload's message type, or None when it is empty, the wrong size for its type or
+# an input with key bits replay.py doesn't know. Both ends drop a peer that sends one
+# rather than trust what follows it.
+def message_kind(payload):
+    if not payload:
+        return None
+    kind = payload[0]
+    size = SIZES.get(kind)
+    if size is not None and len(payload) != size:
+        return None
+    if kind == MSG_INPUT and payload[-1] >= len(KEYS_FOR_BITS):
+        return None
+    if kind == MSG_STATE and len(payload) < STATE.size:
+        return None
+    if kind == MSG_RESULT and (len(payload) < RESULT.size or len(payload) != RESULT.size + payload[1] * SCORE.size):
+        return None
+    return kind
+
+
+# Splits complete frames off the front of buffer, leaving any partial one.
+def frames(buffer):
+    payloads = []
+    start = 0
+    while len(buffer) - start >= 2:
+        (length,) = FRAME.unpack_from(buffer, start)
+        if len(buffer) - start - 2 < length:
+            break
+        payloads.append(bytes(buffer[start + 2:start + 2 + length]))
+        start += 2 + length
+    del buffer[:start]
+    return payloads
+
+
+def player_state(run):
+    player = run.player
+    flags = 0
+    for name, mask in FLAGS.items():
+        if getattr(player, name):
+            flags |= mask
+    if run.over:
+        flags |= FLAG_OVER
+    return (player.rect.y, float(player.velocity_y), player.jetpack_timer, flags, player.health)
+
+
+def apply_state(run, state):
+    player = run.player
+    y, player.velocity_y, player.jetpack_timer, flags, health = state
+    player.rect.y = y
+    for name, mask in FLAGS.items():
+        setattr(player, name, bool(flags & mask))
+    # The server saw a hit the prediction missed: a hit clears the obstacles. (A hit
+    # only the prediction saw can't be undone here; RaceClient avoids needing to.)
+    if health < player.health:
+        run.obstacles.empty()
+        run.collider.clear()
+    player.health = health
+    run.over = bool(flags & FLAG_OVER)
+
+
+# Only the fields that changed since `sent` (the states last broadcast, updated in
+# place); a player standing still costs nothing.
+def encode_state(tick, states, sent):
+    parts = []
+    entries = 0
+    for slot, state in enumerate(states):
+        old = sent[slot]
+        mask = 0
+        fields = []
+        for i, value in enumerate(state):
+            if old is None or value != old[i]:
+                mask |= 1 << i
+                fields.append(FIELDS[i].pack(value))
+        if mask:
+            parts.append(ENTRY.pack(slot, mask))
+            parts.extend(fields)
+            sent[slot] = state
+            entries += 1
+    return STATE.pack(MSG_STATE, tick, entries) + b"".join(parts)
+
+
+# Applies a state message to `states` in place and returns its tick. A message that
+# is cut short or names a slot that isn't in the race raises ValueError and changes
+# nothing.
+def decode_state(payload, states):
+    _, tick, entries = STATE.unpack_from(payload)
+    offset = STATE.size
+    changed = {}
+    try:
+        for _ in range(entries):
+            slot, mask = ENTRY.unpack_from(payload, offset)
+            offset += ENTRY.size
+            if slot >= len(states):
+                raise ValueError(f"state for slot {slot} in a race of {len(states)}")
+            old = changed.get(slot, states[slot])
+            state = list(old) if old is not None else [0, 0.0, 0, 0, 0, 0]
+            for i, field in enumerate(FIELDS):
+                if mask >> i & 1:
+                    (state[i],) = field.unpack_from(payload, offset)
+                    offset += field.size
+            changed[slot] = tuple(state)
+    except struct.error as e:
+        raise ValueError(f"truncated state message: {e}") from None
+    for slot, state in changed.items():
+        states[slot] = state
+    return tick
+
+
+def decode_result(payload):
+    _, players = RESULT.unpack_from(payload)
+    return dict(SCORE.unpack_from(payload, RESULT.size + i * SCORE.size) for i in range(players))
+
+
+class RacePlayer:
+    __slots__ = ("slot", "connection", "run", "inputs", "bits")
+
+    def __init__(self, slot, connection, run):
+        self.slot = slot
+        self.connection = connection
+        self.run = run
+        self.inputs = {}
+        self.bits = 0
+
+
+# One race: every player runs their own RunnerSim on the same seed, so they all face
+# the same course. Inputs are applied on the tick they were sent for; one that
+# arrives after its tick was simulated counts from the next tick on, and a tick with
+# no input repeats the player's last keys.
+class Race:
+    def __init__(self, server, seed, opened):
+        self.server = server
+        self.seed = seed
+        self.opened = opened
+        self.players = []
+        self.sent = []
+        self.tick = 0
+        self.countdown = None
+        self.done = False
+
+    def join(self, connection):
+        player = RacePlayer(len(self.players), connection, self.server.new_run(self.seed))
+        self.players.append(player)
+        self.sent.append(None)
+        return player
+
+    def start(self, lead):
+        self.countdown = lead
+        for player in self.players:
+            self.server.send(player, frame(START.pack(MSG_START, self.seed, player.slot, len(self.players), lead)))
+
+    def input(self, player, tick, bits):
+        if tick > self.tick:
+            player.inputs[tick] = bits
+        else:
+            self.server.late_inputs += 1
+            player.bits = bits
+
+    def step(self):
+        if self.countdown:
+            self.countdown -= 1
+            return
+        tick = self.tick + 1
+        for player in self.players:
+            run = player.run
+            if not run.over:
+                player.bits = player.inputs.pop(tick, player.bits)
+                run.step(KEYS_FOR_BITS[player.bits])
+        self.tick = tick
+
+        states = [player_state(player.run) + (player.bits,) for player in self.players]
+        message = frame(encode_state(tick, states, self.sent))
+        for player in self.players:
+            self.server.send(player, message)
+
+        if all(player.run.over for player in self.players):
+            scores = b"".join(SCORE.pack(player.slot, player.run.score) for player in self.players)
+            message = frame(RESULT.pack(MSG_RESULT, len(self.players)) + scores)
+            for player in self.players:
+                self.server.send(player, message)
+                if player.connection is not None:
+                    player.connection.player = None
+            self.done = True
+
+
+class RaceConnection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.player = None
+        self.race = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+
+    def data_received(self, data):
+        self.buffer += data
+        for payload in frames(self.buffer):
+            kind = message_kind(payload)
+            if kind is None:
+                self.server.malformed += 1
+                self.transport.abort()
+                return
+            if kind == MSG_INPUT and self.player is not None:
+                _, tick, bits = INPUT.unpack(payload)
+                self.server.inputs += 1
+                self.race.input(self.player, tick, bits)
+            elif kind == MSG_JOIN and self.player is None:
+                self.race, self.player = self.server.join(self)
+            elif kind == MSG_STATS:
+                self.transport.write(frame(bytes([MSG_STATS]) + json.dumps(self.server.stats()).encode()))
+
+    # A player who leaves mid-race forfeits, so the race can still finish.
+    def connection_lost(self, exc):
+        self.server.connections -= 1
+        if self.player is not None:
+            self.player.connection = None
+            self.player.run.over = True
+
+
+# Runs every race at a fixed tick rate on one asyncio loop. Joining players wait in a
+# lobby until it has race_size players or lobby_ticks have passed, then race.
+class RaceServer:
+    def __init__(self, new_run, race_size=4, tick_rate=TICK_RATE, lobby_ticks=120, lead=LEAD_TICKS,
+                 seed=None, max_buffer=1 << 16):
+        self.new_run = new_run
+        self.race_size = race_size
+        self.step_seconds = 1 / tick_rate
+        self.lobby_ticks = lobby_ticks
+        self.lead = lead
+        self.rng = random.Random(seed)
+        self.max_buffer = max_buffer
+        self.races = []
+        self.lobby = None
+        self.ticks = 0
+        # Wall and CPU time of each tick's work; on a busy machine the wall time also
+        # counts time spent waiting for the CPU.
+        self.tick_times = deque(maxlen=tick_rate * 60)
+        self.tick_cpu = deque(maxlen=tick_rate * 60)
+        self.overruns = 0
+        self.connections = 0
+        self.inputs = 0
+        self.late_inputs = 0
+        self.bytes_sent = 0
+        self.player_ticks = 0
+        self.dropped = 0
+        self.malformed = 0
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    def join(self, connection):
+        if self.lobby is None:
+            self.lobby = Race(self, self.rng.randrange(2 ** 32), self.ticks)
+        race = self.lobby
+        player = race.join(connection)
+        if len(race.players) >= self.race_size:
+            self._start(race)
+        return race, player
+
+    def _start(self, race):
+        self.lobby = None
+        self.races.append(race)
+        race.start(self.lead)
+
+    # Drops a client whose socket stopped draining instead of buffering without bound.
+    def send(self, player, message):
+        connection = player.connection
+        if connection is None:
+            return
+        transport = connection.transport
+        if transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            transport.abort()
+            return
+        transport.write(message)
+        self.bytes_sent += len(message)
+
+    def tick(self):
+        start = time.perf_counter()
+        cpu = time.process_time()
+        lobby = self.lobby
+        if lobby is not None and self.ticks - lobby.opened >= self.lobby_ticks:
+            self._start(lobby)
+        for race in self.races:
+            race.step()
+            self.player_ticks += len(race.players)
+        if any(race.done for race in self.races):
+            self.races = [race for race in self.races if not race.done]
+        self.ticks += 1
+        self.tick_times.append(time.perf_counter() - start)
+        self.tick_cpu.append(time.process_time() - cpu)
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: RaceConnection(self), host, port)
+        next_tick = loop.time()
+        async with server:
+            while True:
+                self.tick()
+                next_tick += self.step_seconds
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    # Fell behind: the lost time is skipped rather than made up in a burst.
+                    self.overruns += 1
+                    next_tick = loop.time()
+                    delay = 0
+                await asyncio.sleep(delay)
+
+    def stats(self):
+        budget = self.step_seconds * 1000
+        wall = time.perf_counter() - self.started
+        stats = {"ticks": self.ticks, "budget_ms": budget}
+        for name, samples in (("tick", self.tick_times), ("tick_cpu", self.tick_cpu)):
+            times = sorted(samples) or [0.0]
+            stats[f"{name}_mean_ms"] = sum(times) / len(times) * 1000
+            stats[f"{name}_p99_ms"] = times[int(len(times) * 0.99)] * 1000
+            stats[f"{name}_max_ms"] = times[-1] * 1000
+        stats["headroom"] = 1 - stats["tick_cpu_p99_ms"] / budget
+        return {
+            **stats,
+            "overruns": self.overruns,
+            "cpu": (time.process_time() - self.cpu_started) / wall if wall else 0.0,
+            "connections": self.connections,
+            "races": len(self.races),
+            "racing": sum(len(race.players) for race in self.races),
+            "inputs": self.inputs,
+            "late_inputs": self.late_inputs,
+            "dropped": self.dropped,
+            "malformed": self.malformed,
+            "bytes_per_player_tick": self.bytes_sent / self.player_ticks if self.player_ticks else 0.0,
+        }
+
+
+# The game's side of a race, polled from its frame loop over a non-blocking socket.
+# The local player is simulated ahead of the server from the same seed, so input
+# takes effect at once; each state the server sends for this player is compared
+# with what was predicted for that tick. On a mismatch the run goes back to the
+# tick before, the last one both agreed on, and runs the tick again with the keys
+# the server applied, which gives the server's state including its obstacles; the
+# inputs since are then simulated again. Other players are shown as they were last
+# reported.
+class RaceClient:
+    def __init__(self, address, new_run, history=120):
+        self.new_run = new_run
+        self.history = history
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        self.outgoing = bytearray()
+        self.connected = True
+        self.run = None
+        self.slot = None
+        self.lead = LEAD_TICKS
+        self.states = []
+        self.previous = []
+        self.server_tick = 0
+        self.tick = 0
+        self.inputs = {}
+        self.predicted = {}
+        self.snapshots = {}
+        self.confirmed = {}
+        self.corrections = 0
+        self.results = None
+        self._send(JOIN.pack(MSG_JOIN))
+
+    # Queues a message and sends as much as the socket takes now; the rest goes out
+    # on later flushes, so a full send buffer never splits or drops a message.
+    def _send(self, payload):
+        self.outgoing += frame(payload)
+        self._flush()
+
+    def _flush(self):
+        while self.outgoing and self.connected:
+            try:
+                sent = self.sock.send(self.outgoing)
+            except BlockingIOError:
+                break
+            except OSError:
+                self.connected = False
+                break
+            del self.outgoing[:sent]
+
+    def poll(self):
+        self._flush()
+        while self.connected:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self.connected = False
+                break
+            self.buffer += data
+        for payload in frames(self.buffer):
+            kind = message_kind(payload)
+            try:
+                if kind is None:
+                    raise ValueError(f"{len(payload)} byte message of type {payload[:1].hex() or 'none'}")
+                if kind == MSG_STATE and self.run is not None:
+                    self._state(payload)
+                elif kind == MSG_START:
+                    _, seed, slot, players, self.lead = START.unpack(payload)
+                    if slot >= players:
+                        raise ValueError(f"slot {slot} in a race of {players}")
+                    self.slot = slot
+                    self.run = self.new_run(seed)
+                    self.states = [None] * players
+                    self.previous = [None] * players
+                    self._record(0)
+                elif kind == MSG_RESULT:
+                    self.results = decode_result(payload)
+            except ValueError as e:
+                print(f"race: leaving, the server sent a malformed message ({e})")
+                self.close()
+                break
+
+    def _state(self, payload):
+        previous = list(self.states)
+        tick = self.server_tick = decode_state(payload, self.states)
+        self.previous = previous
+        self.confirmed[tick] = self.states[self.slot]
+        self.confirmed.pop(tick - self.history, None)
+        self._check(tick)
+
+    # How many ticks to run this frame: the timestep's count, nudged so the local
+    # simulation stays about `lead` ticks ahead of the server's.
+    def steps(self, steps):
+        ahead = self.tick - self.server_tick
+        if ahead < 1:
+            return steps + 1
+        if ahead > self.lead * 3 and steps:
+            return steps - 1
+        return steps
+
+    def step(self, keys):
+        run = self.run
+        tick = self.tick + 1
+        bits = key_bits(keys)
+        self._send(INPUT.pack(MSG_INPUT, tick, bits))
+        self.inputs[tick] = bits
+        hit = run.step(KEYS_FOR_BITS[bits])
+        self.tick = tick
+        self._record(tick)
+        old = tick - self.history
+        self.inputs.pop(old, None)
+        self.predicted.pop(old, None)
+        self.snapshots.pop(old, None)
+        # Behind the server, its state for this tick is already in.
+        self._check(tick)
+        return hit
+
+    def _record(self, tick):
+        self.predicted[tick] = player_state(self.run)
+        self.snapshots[tick] = snapshot(self.run)
+
+    def _check(self, tick):
+        state = self.confirmed.get(tick)
+        predicted = self.predicted.get(tick)
+        if state is not None and predicted is not None and predicted != state[:-1]:
+            self._rollback(tick, state)
+
+    def _rollback(self, tick, state):
+        run = self.run
+        player = run.player
+        # Effects already played once; the re-simulated ticks don't emit them again.
+        exhaust, effects = player.exhaust, run.effects
+        player.exhaust = run.effects = None
+        bits = state[-1]
+        agreed = self.snapshots.get(tick - 1)
+        if agreed is not None:
+            restore(run, agreed)
+            if not run.over:
+                run.step(KEYS_FOR_BITS[bits])
+            self.inputs[tick] = bits
+        else:
+            restore(run, self.snapshots[tick])
+        # Only needed past the history, where the obstacles may stay off.
+        if player_state(run) != state[:-1]:
+            apply_state(run, state[:-1])
+        self._record(tick)
+        for t in range(tick + 1, self.tick + 1):
+            if run.over:
+                break
+            run.step(KEYS_FOR_BITS[self.inputs[t]])
+            self._record(t)
+        player.exhaust, run.effects = exhaust, effects
+        self.corrections += 1
+
+    @property
+    def started(self):
+        return self.run is not None
+
+    @property
+    def racing(self):
+        return sum(1 for state in self.states if state is not None and not state[3] & FLAG_OVER)
+
+    def close(self):
+        self.sock.close()
+        self.connected = False
+
+
+# Draws the other racers as translucent ghosts behind the local player; used in
+# place of the player by the renderers.
+class RaceView:
+    def __init__(self, client, alpha=110):
+        self.client = client
+        self.alpha = alpha
+        self.ghosts = {}
+
+    def _ghost(self, image):
+        ghost = self.ghosts.get(image)
+        if ghost is None:
+            ghost = image.copy()
+            ghost.set_alpha(self.alpha)
+            self.ghosts[image] = ghost
+        return ghost
+
+    def parts(self, alpha=1.0):
+        client = self.client
+        player = client.run.player
+        animations = player.animator.animations
+        parts = []
+        for slot, state in enumerate(client.states):
+            if slot == client.slot or state is None or state[3] & FLAG_OVER:
+                continue
+            flags = state[3]
+            if flags & FLAGS["jetpack_enabled"] and flags & FLAGS["is_flying"]:
+                name = "fly"
+            elif not flags & FLAGS["grounded"]:
+                name = "jump"
+            else:
+                name = "run"
+            previous = client.previous[slot] if slot < len(client.previous) else None
+            y = state[0] if previous is None else round(previous[0] + (state[0] - previous[0]) * alpha)
+            parts.append((self._ghost(animations[name].frames[0]), (player.rect.x, y)))
+        return parts + player.parts(alpha)
+
+    def draw(self, surface, alpha=1.0):
+        for image, pos in self.parts(alpha):
+            surface.blit(image, pos)
+
+
+def serve_forever(game, host, port, race_size, tick_rate, seed=None):
+    import headless
+
+    module = headless.load_game(game)
+    server = RaceServer(module.new_run, race_size, tick_rate, seed=seed)
+    print(f"race server for {game} on {host}:{port}, {race_size} per race at {tick_rate} ticks/s")
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+class BotConnection(asyncio.Protocol):
+    def __init__(self, bots, seed):
+        self.bots = bots
+        self.rng = random.Random(seed)
+        self.transport = None
+        self.buffer = bytearray()
+        self.tick = None
+        self.server_tick = 0
+        self.held = 0
+        self.ready = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport.write(frame(JOIN.pack(MSG_JOIN)))
+        self.ready.set_result(True)
+
+    def data_received(self, data):
+        self.buffer += data
+        self.bots.received += len(data)
+        for payload in frames(self.buffer):
+            kind = message_kind(payload)
+            if kind is None:
+                self.transport.abort()
+                return
+            if kind == MSG_STATE:
+                self.server_tick = STATE.unpack_from(payload)[1]
+                self.bots.states += 1
+            elif kind == MSG_START:
+                self.tick = self.server_tick = 0
+                self.bots.races += 1
+            elif kind == MSG_RESULT:
+                # Straight into the next race.
+                self.tick = None
+                self.bots.results += 1
+                self.transport.write(frame(JOIN.pack(MSG_JOIN)))
+            elif kind == MSG_STATS:
+                self.bots.server_stats.set_result(json.loads(payload[1:]))
+
+    # A player who mostly runs right, jumps now and then, and sometimes uses the jetpack.
+    # Like RaceClient, it keeps its ticks ahead of the server's when it falls behind.
+    def send_input(self):
+        if self.tick is None:
+            return
+        self.tick = max(self.tick + 1, self.server_tick + 2)
+        if self.held:
+            self.held -= 1
+        elif self.rng.random() < 0.04:
+            self.held = self.rng.randint(1, 20)
+        bits = 4 | (1 if self.held else 0) | (2 if self.rng.random() < 0.002 else 0)
+        self.transport.write(frame(INPUT.pack(MSG_INPUT, self.tick, bits)))
+
+
+class Bots:
+    def __init__(self):
+        self.received = 0
+        self.states = 0
+        self.races = 0
+        self.results = 0
+        self.server_stats = None
+
+
+async def run_bots(host, port, clients, seconds, tick_rate, seed=0):
+    loop = asyncio.get_running_loop()
+    bots = Bots()
+    connections = []
+    for i in range(clients):
+        _, connection = await loop.create_connection(lambda: BotConnection(bots, seed + i), host, port)
+        await connection.ready
+        connections.append(connection)
+
+    step = 1 / tick_rate
+    end = loop.time() + seconds
+    next_tick = loop.time()
+    while loop.time() < end:
+        for connection in connections:
+            connection.send_input()
+        next_tick += step
+        await asyncio.sleep(max(next_tick - loop.time(), 0))
+
+    bots.server_stats = loop.create_future()
+    connections[0].transport.write(frame(bytes([MSG_STATS])))
+    stats = await asyncio.wait_for(bots.server_stats, 10)
+    for connection in connections:
+        connection.transport.close()
+    return bots, stats
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"race server did not come up on {host}:{port}")
+
+
+# Starts a server in its own process and connects `clients` bots that race
+# continuously, then reports the server's tick times against its tick budget.
+def load_test(args):
+    import multiprocessing
+
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve_forever, args=(args.game, args.host, args.port, args.race_size, args.tick_rate, args.seed),
+        daemon=True)
+    process.start()
+    try:
+        wait_for_port(args.host, args.port)
+        bots, stats = asyncio.run(run_bots(args.host, args.port, args.clients, args.seconds,
+                                           args.tick_rate, args.seed))
+    finally:
+        # SDL turns SIGTERM into a QUIT event the server never reads.
+        process.kill()
+        process.join()
+
+    print(f"{args.clients} clients, {stats['ticks']} server ticks, {bots.races} race entries, "
+          f"{bots.results} finishes, {stats['racing']} racing at the end")
+    for name, label in (("tick_cpu", "tick cpu"), ("tick", "tick wall")):
+        print(f"{label}: mean={stats[name + '_mean_ms']:.2f} p99={stats[name + '_p99_ms']:.2f} "
+              f"max={stats[name + '_max_ms']:.2f} ms of {stats['budget_ms']:.2f} ms")
+    print(f"headroom {stats['headroom']:.0%} of the tick budget at p99, {stats['overruns']} overruns")
+    print(f"server cpu {stats['cpu']:.0%} (inputs included), {stats['inputs']} inputs, "
+          f"{stats['late_inputs']} late, {stats['dropped']} dropped clients, {stats['malformed']} malformed")
+    print(f"state: {stats['bytes_per_player_tick']:.1f} bytes per player per tick, "
+          f"{bots.received / max(args.seconds, 1e-9) / 1024:.0f} KB/s received by all clients")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"clients": args.clients, "server": stats}, f, indent=2)
+    return 0 if stats["headroom"] > 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multiplayer race server and its load test.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help in (("serve", "run a race server"), ("loadtest", "measure a server under many clients")):
+        command = sub.add_parser(name, help=help)
+        command.add_argument("--game", choices=("main", "makeshift2", "jurassic"), default="main")
+        command.add_argument("--host", default="127.0.0.1")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT)
+        command.add_argument("--race-size", type=int, default=4)
+        command.add_argument("--tick-rate", type=int, default=TICK_RATE)
+        command.add_argument("--seed", type=int)
+    loadtest = sub.choices["loadtest"]
+    loadtest.add_argument("--clients", type=int, default=400)
+    loadtest.add_argument("--seconds", type=float, default=20)
+    loadtest.add_argument("--json", help="also write the results here")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve_forever(args.game, args.host, args.port, args.race_size, args.tick_rate, args.seed)
+        return 0
+    if args.seed is None:
+        args.seed = 0
+    return load_test(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+from weakref import WeakKeyDictionary
+
+import pygame
+
+from options import option
+from profiler import profiler
+
+RENDER_MODES = ("flip", "dirty")
+UPSCALE_FILTERS = ("smooth", "nearest")
+
+LAYER_PLAYER = 1
+LAYER_OBSTACLES = 2
+LAYER_HUD = 3
+
+
+# --render=dirty on the command line wins over the RENDER_MODE environment variable.
+def render_mode(argv=None, default="flip"):
+    mode = option("render", "RENDER_MODE", argv, default)
+    if mode not in RENDER_MODES:
+        raise ValueError(f"unknown render mode {mode!r}, expected one of {RENDER_MODES}")
+    return mode
+
+
+# --scale=0.5 (or RENDER_SCALE) draws the world at half the window size and upscales it.
+def render_scale(argv=None, default=1.0):
+    scale = float(option("scale", "RENDER_SCALE", argv, default))
+    if not 0 < scale <= 1:
+        raise ValueError(f"render scale must be in (0, 1], got {scale}")
+    return scale
+
+
+# --upscale=smooth (or RENDER_UPSCALE) filters the upscale instead of keeping hard pixel
+# edges; it costs a software smoothscale of the whole frame.
+def upscale_filter(argv=None, default="nearest"):
+    upscale = option("upscale", "RENDER_UPSCALE", argv, default)
+    if upscale not in UPSCALE_FILTERS:
+        raise ValueError(f"unknown upscale filter {upscale!r}, expected one of {UPSCALE_FILTERS}")
+    return upscale
+
+
+# --hud=scaled (or RENDER_HUD) draws the HUD at the internal resolution with the world.
+def native_hud(argv=None, default="native"):
+    hud = option("hud", "RENDER_HUD", argv, default)
+    if hud not in ("native", "scaled"):
+        raise ValueError(f"unknown HUD resolution {hud!r}, expected native or scaled")
+    return hud == "native"
+
+
+def make_renderer(screen, background, mode=None, scale=None, upscale=None, hud_native=None):
+    if mode is None:
+        mode = render_mode()
+    # A scrolling background changes every pixel of every frame, so there is nothing
+    # for dirty mode to skip; such scenes always flip.
+    if mode == "dirty" and hasattr(background, "draw"):
+        print("render: --render=dirty needs a static background, this scene scrolls; using flip")
+    elif mode == "dirty":
+        return DirtyRenderer(screen, background)
+    return FlipRenderer(screen, background,
+                        render_scale() if scale is None else scale,
+                        upscale_filter() if upscale is None else upscale,
+                        native_hud() if hud_native is None else hud_native)
+
+
+# Stands in for the screen while the world is drawn at an internal resolution: it
+# takes the same blit/fill calls in the logical 1280x720 coordinates and draws each
+# image as a copy scaled once, at scaled positions, onto a smaller surface. present()
+# upscales that to the display in one pass.
+class Canvas:
+    def __init__(self, display, scale, upscale="nearest"):
+        self.display = display
+        self.scale = scale
+        self.upscale = upscale
+        width, height = display.get_size()
+        self.surface = pygame.Surface((max(1, round(width * scale)), max(1, round(height * scale)))).convert()
+        self.images = WeakKeyDictionary()
+
+    def image(self, image):
+        scaled = self.images.get(image)
+        if scaled is None:
+            width, height = image.get_size()
+            size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+            if image.get_bitsize() >= 24:
+                scaled = pygame.transform.smoothscale(image, size)
+            else:
+                scaled = pygame.transform.scale(image, size)
+            self.images[image] = scaled
+        # Surface-wide alpha is set right before a blit (the parallax crossfade).
+        alpha = image.get_alpha()
+        if alpha != scaled.get_alpha():
+            scaled.set_alpha(alpha)
+        return scaled
+
+    # For surfaces redrawn in place, such as HUD lines.
+    def forget(self, image):
+        self.images.pop(image, None)
+
+    def blit(self, image, pos):
+        scale = self.scale
+        return self.surface.blit(self.image(image), (round(pos[0] * scale), round(pos[1] * scale)))
+
+    def blits(self, blits, doreturn=True):
+        scale = self.scale
+        image = self.image
+        return self.surface.blits([(image(source), (round(pos[0] * scale), round(pos[1] * scale)))
+                                   for source, pos in blits], doreturn)
+
+    def fill(self, color):
+        self.surface.fill(color)
+
+    def get_size(self):
+        return self.display.get_size()
+
+    def get_width(self):
+        return self.display.get_width()
+
+    def get_height(self):
+        return self.display.get_height()
+
+    def get_rect(self):
+        return self.display.get_rect()
+
+    def present(self):
+        size = self.display.get_size()
+        if self.upscale == "smooth":
+            pygame.transform.smoothscale(self.surface, size, self.display)
+        else:
+            pygame.transform.scale(self.surface, size, self.display)
+
+
+# Redraws the whole frame every time. Below a scale of 1 the world goes through a
+# Canvas at the internal resolution, and the HUD and profiler graph are drawn over
+# the upscaled frame at full resolution unless hud_native is off.
+class FlipRenderer:
+    def __init__(self, screen, background, scale=1.0, upscale="nearest", hud_native=True):
+        self.screen = screen
+        self.background = background
+        self.upscale = upscale
+        self.hud_native = hud_native
+        self.canvas = None
+        self.set_scale(scale)
+        self.pixels = 0
+
+    def set_scale(self, scale):
+        self.scale = scale
+        self.canvas = Canvas(self.screen, scale, self.upscale) if scale < 1 else None
+
+    def draw(self, player, obstacles, hud, alpha=1.0, particles=None):
+        canvas = self.canvas
+        target = canvas or self.screen
+        if hasattr(self.background, "draw"):
+            self.background.draw(target, alpha)
+        else:
+            target.fill(self.background)
+        profiler.mark("background")
+        player.draw(target, alpha)
+        target.blits([(sprite.image, sprite.lerp_pos(alpha)) for sprite in obstacles], False)
+        if particles is not None:
+            if canvas is not None:
+                particles.draw(canvas.surface, alpha, canvas.scale)
+            else:
+                particles.draw(self.screen, alpha)
+
+        changed = hud.take_dirty()
+        if canvas is not None and not self.hud_native:
+            for i in changed:
+                canvas.forget(hud.lines[i].surface)
+            for line in hud.lines:
+                canvas.blit(line.surface, line.pos)
+        if canvas is not None:
+            canvas.present()
+        if canvas is None or self.hud_native:
+            for line in hud.lines:
+                self.screen.blit(line.surface, line.pos)
+        profiler.draw_overlay(self.screen)
+        profiler.mark("draw")
+
+        pygame.display.flip()
+        profiler.mark("present")
+        surface = canvas.surface if canvas is not None else self.screen
+        self.pixels = surface.get_width() * surface.get_height()
+
+
+class Proxy(pygame.sprite.DirtySprite):
+    def __init__(self):
+        super().__init__()
+        self.image = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+
+    def show(self, image, pos):
+        if image is not self.image or self.rect.topleft != pos or not self.visible:
+            self.image = image
+            self.rect.size = image.get_size()
+            self.rect.topleft = pos
+            self.visible = 1
+            self.dirty = 1
+
+    def hide(self):
+        if self.visible:
+            self.visible = 0
+            self.dirty = 1
+
+
+# Redraws and pushes only what changed since the last frame, over a background of one
+# color. make_renderer never hands it a scrolling background.
+class DirtyRenderer:
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self.group = pygame.sprite.LayeredDirty()
+        self.backdrop = pygame.Surface(screen.get_size()).convert()
+        self.backdrop.fill(background)
+        self.group.clear(screen, self.backdrop)
+
+        self.player_parts = []
+        self.obstacles = {}
+        self.hud = []
+        self.overlay = None
+        self.particles = None
+        self.pixels = 0
+
+    def _slots(self, slots, count, layer):
+        while len(slots) < count:
+            proxy = Proxy()
+            slots.append(proxy)
+            self.group.add(proxy, layer=layer)
+
+    def draw(self, player, obstacles, hud, alpha=1.0, particles=None):
+        profiler.mark("background")
+
+        parts = player.parts(alpha)
+        self._slots(self.player_parts, len(parts), LAYER_PLAYER)
+        for proxy, (image, pos) in zip(self.player_parts, parts):
+            proxy.show(image, pos)
+        for proxy in self.player_parts[len(parts):]:
+            proxy.hide()
+
+        for sprite in obstacles:
+            proxy = self.obstacles.get(sprite)
+            if proxy is None:
+                proxy = Proxy()
+                self.obstacles[sprite] = proxy
+                self.group.add(proxy, layer=LAYER_OBSTACLES)
+            proxy.show(sprite.image, sprite.lerp_pos(alpha))
+        if len(self.obstacles) != len(obstacles):
+            for sprite in [s for s in self.obstacles if s not in obstacles]:
+                self.group.remove(self.obstacles.pop(sprite))
+
+        # HUD lines are redrawn in place, so the HUD says which ones changed.
+        changed = hud.take_dirty()
+        self._slots(self.hud, len(hud.lines), LAYER_HUD)
+        for i, (proxy, line) in enumerate(zip(self.hud, hud.lines)):
+            proxy.show(line.surface, line.pos)
+            if i in changed:
+                proxy.dirty = 1
+
+        # The profiler graph is painted over the finished frame; once it is switched
+        # off the area it covered has to be repainted from the sprites.
+        if self.overlay is not None and profiler.overlay is None:
+            self.group.repaint_rect(self.overlay)
+            self.overlay = None
+
+        # Particles are not sprites: they are blitted over the finished sprites, and
+        # the area they covered last frame is repainted first.
+        if self.particles is not None:
+            self.group.repaint_rect(self.particles)
+        rects = self.group.draw(self.screen)
+        area = particles.draw(self.screen, alpha) if particles is not None else None
+        if area is not None:
+            area = area.clip(self.screen.get_rect())
+            rects.append(area if self.particles is None else area.union(self.particles))
+        elif self.particles is not None:
+            rects.append(self.particles)
+        self.particles = area
+        if profiler.overlay is not None:
+            self.overlay = profiler.draw_overlay(self.screen).copy()
+            rects.append(self.overlay)
+        profiler.mark("draw")
+        pygame.display.update(rects)
+        profiler.mark("present")
+        self.pixels = sum(rect.width * rect.height for rect in rects)
@@ -0,0 +1,296 @@
+import argparse
+import atexit
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+import pygame
+
+from controls import NO_KEYS, Keys
+from options import option
+
+MAGIC = b"HRPL"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+SNAPSHOT_EVERY = 600
+
+# The only keys Player.update reads, as bits of a 0-7 value per tick.
+INPUT_KEYS = (pygame.K_SPACE, pygame.K_j, pygame.K_RIGHT)
+KEYS_FOR_BITS = [Keys(key for i, key in enumerate(INPUT_KEYS) if bits >> i & 1) for bits in range(8)]
+
+# The loop each game records from and plays back through.
+LOOPS = {"main": "play", "makeshift2": "main", "jurassic": "main"}
+
+
+# --record=run.replay on the command line (or REPLAY_RECORD) records the run being played.
+def record_path(argv=None):
+    return option("record", "REPLAY_RECORD", argv)
+
+
+def key_bits(keys):
+    bits = 0
+    for i, key in enumerate(INPUT_KEYS):
+        if keys[key]:
+            bits |= 1 << i
+    return bits
+
+
+# Runs of equal input as LEB128 varints of (length - 1) << 3 | bits.
+def encode_runs(runs):
+    out = bytearray()
+    for bits, length in runs:
+        value = (length - 1) << 3 | bits
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_runs(data):
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            yield value & 7, (value >> 3) + 1
+            value = 0
+            shift = 0
+
+
+# Everything needed to put a RunnerSim back at the current tick. Player attributes are
+# taken generically (every plain value) so the three games' players all work; the
+# spawn stream isn't stored, since its position follows from the tick.
+def snapshot(run):
+    player = run.player
+    kinds = {cls: kind for kind, cls in run.obstacle_types.items()}
+    return {
+        "ticks": run.ticks,
+        "score": run.score,
+        "over": run.over,
+        "player": {name: value for name, value in vars(player).items()
+                   if isinstance(value, (bool, int, float, str))},
+        "rect": list(player.rect),
+        "prev_pos": list(player.prev_pos) if player.prev_pos is not None else None,
+        "animation": [player.animator.state, player.animator.time],
+        "obstacles": [[kinds[type(obstacle)], *obstacle.rect.topleft,
+                       *(obstacle.prev_pos if obstacle.prev_pos is not None else obstacle.rect.topleft)]
+                      for obstacle in run.obstacles],
+    }
+
+
+def restore(run, state):
+    player = run.player
+    for name, value in state["player"].items():
+        setattr(player, name, value)
+    player.rect.update(state["rect"])
+    player.prev_pos = tuple(state["prev_pos"]) if state["prev_pos"] is not None else None
+    player.animator.state, player.animator.time = state["animation"]
+    player.image = player.animator.image
+
+    run.obstacles.empty()
+    run.collider.clear()
+    for kind, x, y, prev_x, prev_y in state["obstacles"]:
+        obstacle = run.obstacles.pool.acquire(run.obstacle_types[kind], x)
+        obstacle.rect.topleft = (x, y)
+        obstacle.prev_pos = (prev_x, prev_y)
+        run.obstacles.add(obstacle)
+        run.collider.add(obstacle)
+
+    run.ticks = state["ticks"]
+    run.score = state["score"]
+    run.over = state["over"]
+    run.spawns.seek(run.ticks)
+
+
+class Replay:
+    def __init__(self, game, seed, inputs=b"", ticks=0, snapshots=(), final=None, snapshot_every=SNAPSHOT_EVERY):
+        self.game = game
+        self.seed = seed
+        self.inputs = inputs
+        self.ticks = ticks
+        self.snapshots = list(snapshots)
+        self.final = final
+        self.snapshot_every = snapshot_every
+
+    def save(self, path):
+        meta = zlib.compress(json.dumps({
+            "game": self.game,
+            "seed": self.seed,
+            "ticks": self.ticks,
+            "snapshot_every": self.snapshot_every,
+            "snapshots": self.snapshots,
+            "final": self.final,
+        }, separators=(",", ":")).encode(), 9)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(meta)))
+            f.write(meta)
+            f.write(self.inputs)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, meta_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} replay")
+        start = HEADER.size
+        meta = json.loads(zlib.decompress(data[start:start + meta_length]))
+        return cls(meta["game"], meta["seed"], data[start + meta_length:], meta["ticks"],
+                   meta["snapshots"], meta["final"], meta["snapshot_every"])
+
+    # The latest snapshot at or before tick, or None to start from the beginning.
+    def snapshot_before(self, tick):
+        best = None
+        for state in self.snapshots:
+            if state["ticks"] <= tick:
+                best = state
+        return best
+
+
+# Feeds the recorded keys back one tick at a time, from tick `start` on.
+class ReplayInput:
+    def __init__(self, replay, start=0):
+        self.runs = decode_runs(replay.inputs)
+        self.bits = 0
+        self.left = 0
+        for bits, length in self.runs:
+            if start < length:
+                self.bits, self.left = bits, length - start
+                break
+            start -= length
+
+    def _next(self):
+        if self.left == 0:
+            run = next(self.runs, None)
+            if run is None:
+                return None
+            self.bits, self.left = run
+        self.left -= 1
+        return self.bits
+
+    def read(self):
+        bits = self._next()
+        return NO_KEYS if bits is None else KEYS_FOR_BITS[bits]
+
+
+class Recorder:
+    def __init__(self, run, game, path, snapshot_every=SNAPSHOT_EVERY):
+        self.run = run
+        self.game = game
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.runs = []
+        self.bits = None
+        self.length = 0
+        self.snapshots = []
+        self.saved = False
+        atexit.register(self.save)
+
+    def record(self, keys):
+        ticks = self.run.ticks
+        if ticks and ticks % self.snapshot_every == 0:
+            self.snapshots.append(snapshot(self.run))
+        bits = key_bits(keys)
+        if bits == self.bits:
+            self.length += 1
+        else:
+            if self.length:
+                self.runs.append((self.bits, self.length))
+            self.bits = bits
+            self.length = 1
+
+    def wrap(self, source):
+        return RecordingInput(source, self)
+
+    def replay(self):
+        runs = self.runs + ([(self.bits, self.length)] if self.length else [])
+        final = {"score": self.run.score, "health": self.run.player.health, "over": self.run.over}
+        return Replay(self.game, self.run.seed, encode_runs(runs), self.run.ticks,
+                      self.snapshots, final, self.snapshot_every)
+
+    def save(self):
+        if self.saved:
+            return
+        self.saved = True
+        self.replay().save(self.path)
+        print(f"replay: {self.run.ticks} ticks written to {os.path.abspath(self.path)}")
+
+
+class RecordingInput:
+    def __init__(self, source, recorder):
+        self.source = source
+        self.recorder = recorder
+
+    def read(self):
+        keys = self.source.read()
+        self.recorder.record(keys)
+        return keys
+
+
+def recording(run, game, argv=None):
+    path = record_path(argv)
+    return Recorder(run, game, path) if path else None
+
+
+# Rebuilds the run at `tick` headless: restores the nearest snapshot and simulates
+# only the ticks after it.
+def seek(game, replay, tick):
+    run = game.new_run(replay.seed)
+    state = replay.snapshot_before(tick)
+    if state is not None:
+        restore(run, state)
+    inputs = ReplayInput(replay, run.ticks)
+    while run.ticks < tick and not run.over:
+        run.step(inputs.read())
+    return run
+
+
+def main(argv=None):
+    import headless
+
+    parser = argparse.ArgumentParser(description="Inspect and play back recorded runs.")
+    parser.add_argument("replay")
+    parser.add_argument("--headless", action="store_true", help="simulate at full speed without a window")
+    parser.add_argument("--seek", type=int, help="with --headless, jump to this tick via the nearest snapshot")
+    args = parser.parse_args(argv)
+
+    path = os.path.abspath(args.replay)
+    replay = Replay.load(path)
+    size = os.path.getsize(path)
+    minutes = replay.ticks / 60 / 60
+    print(f"{replay.game} seed={replay.seed}: {replay.ticks} ticks, {len(replay.snapshots)} snapshots, "
+          f"{size} bytes ({size / max(minutes, 1 / 60) / 1024:.1f} KB/min), final {replay.final}")
+
+    if not args.headless:
+        from controls import override
+
+        # Watching a recording isn't a new score.
+        os.environ["SCORES_DB"] = "off"
+        game = headless.load_game(replay.game)
+        override(keys=ReplayInput(replay))
+        getattr(game, LOOPS[replay.game])(replay.seed)
+        return 0
+
+    game = headless.load_game(replay.game)
+    tick = replay.ticks if args.seek is None else args.seek
+    start = time.perf_counter()
+    run = seek(game, replay, tick)
+    seconds = time.perf_counter() - start
+    print(f"tick {run.ticks}: score={run.score} health={run.player.health} over={run.over} "
+          f"in {seconds * 1000:.1f} ms")
+    if run.ticks == replay.ticks:
+        final = {"score": run.score, "health": run.player.health, "over": run.over}
+        if final != replay.final:
+            print(f"replay DIVERGED: recorded {replay.final}, got {final}")
+            return 1
+        print("replay matches the recording")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+from collision import SweepCollider
+from pool import ObstacleGroup
+from profiler import profiler
+
+
+# The per-tick game rules shared by play() and both main() loops, without any
+# input polling, timing or drawing so it can also be stepped headless.
+class RunnerSim:
+    def __init__(self, player, spawns, obstacle_types, collider=None):
+        self.player = player
+        self.spawns = spawns
+        self.seed = spawns.seed
+        self.obstacle_types = obstacle_types
+        self.obstacles = ObstacleGroup()
+        self.collider = collider if collider is not None else SweepCollider()
+        self.score = 0
+        self.ticks = 0
+        self.over = False
+        # Cosmetic particle effects (particles.Effects), attached by the game loops.
+        self.effects = None
+
+    # Advances one tick and returns True when the player got hit.
+    def step(self, keys):
+        self.player.snapshot()
+        for obstacle in self.obstacles:
+            obstacle.snapshot()
+
+        self.player.update(keys)
+        self.obstacles.update()
+        self.collider.prune()
+        if self.effects is not None:
+            self.effects.update()
+        profiler.mark("update")
+
+        for event in self.spawns.due(self.ticks + 1):
+            obstacle = self.obstacles.pool.acquire(self.obstacle_types[event.kind], event.x)
+            obstacle.snapshot()
+            self.obstacles.add(obstacle)
+            self.collider.add(obstacle)
+        profiler.mark("spawn")
+
+        hit = False
+        obstacle = self.collider.collide(self.player)
+        if obstacle is not None:
+            hit = True
+            if self.effects is not None:
+                self.effects.hit(self.player, obstacle)
+            self.player.health -= 1
+            self.obstacles.empty()
+            self.collider.clear()
+            if self.player.health <= 0:
+                self.over = True
+        profiler.mark("collision")
+
+        self.score += 1
+        self.ticks += 1
+        return hit
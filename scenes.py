@@ -0,0 +1,60 @@
+class Scene:
+    name = "scene"
+
+    # Pushed onto the stack; arguments come from SceneStack.push().
+    def enter(self, *args):
+        pass
+
+    # Popped off the stack, or dropped by clear().
+    def exit(self):
+        pass
+
+    # On top again after the scene above it was popped.
+    def resume(self):
+        pass
+
+    def frame(self, scenes):
+        raise NotImplementedError
+
+
+# Replaces scenes calling each other's loops: the active scene is the top of an
+# explicit stack and runs one frame at a time, so going back is a pop instead of
+# another nested call. Scene instances are kept for the whole session, one per class,
+# so whatever a scene builds in __init__ is reused on every visit and a class can be
+# on the stack only once.
+class SceneStack:
+    def __init__(self):
+        self.stack = []
+        self.scenes = {}
+
+    def get(self, cls):
+        scene = self.scenes.get(cls)
+        if scene is None:
+            scene = cls()
+            self.scenes[cls] = scene
+        return scene
+
+    def push(self, cls, *args):
+        scene = self.get(cls)
+        self.stack.append(scene)
+        scene.enter(*args)
+
+    def pop(self):
+        self.stack.pop().exit()
+        if self.stack:
+            self.stack[-1].resume()
+
+    def clear(self):
+        while self.stack:
+            self.stack.pop().exit()
+
+    @property
+    def top(self):
+        return self.stack[-1] if self.stack else None
+
+    # Runs from a fresh stack with cls at the bottom until every scene has popped.
+    def run(self, cls, *args):
+        self.clear()
+        self.push(cls, *args)
+        while self.stack:
+            self.stack[-1].frame(self)
@@ -0,0 +1,98 @@
+import random
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+SpawnEvent = namedtuple("SpawnEvent", ("tick", "kind", "x"))
+
+
+# Describes an obstacle course: one spawn every `period` ticks at spawn_x plus up to
+# `jitter` pixels, cycling through `cycle` where each slot is a tuple of kinds to pick
+# from at random. Every `ramp_every` spawns the period shrinks by one tick until it
+# reaches `min_period`, which is how difficulty ramps up.
+class Pattern:
+    def __init__(self, period, spawn_x, jitter, cycle, min_period=None, ramp_every=None):
+        self.period = period
+        self.spawn_x = spawn_x
+        self.jitter = jitter
+        self.cycle = cycle
+        self.min_period = period if min_period is None else min_period
+        self.ramp_every = ramp_every
+
+
+# The ticks (1-based simulation steps) a pattern spawns on. They do not depend on the
+# seed or on how the run goes.
+def spawn_ticks(pattern):
+    period = pattern.period
+    tick = 0
+    count = 0
+    while True:
+        tick += period
+        yield tick
+
+        count += 1
+        if pattern.ramp_every and count % pattern.ramp_every == 0 and period > pattern.min_period:
+            period -= 1
+
+
+# Infinite, lazily generated spawn schedule; the same seed always yields the same course.
+def spawn_events(seed, pattern):
+    rng = random.Random(seed)
+    cycle = pattern.cycle
+    for count, tick in enumerate(spawn_ticks(pattern)):
+        x = pattern.spawn_x + rng.randint(0, pattern.jitter)
+        kinds = cycle[count % len(cycle)]
+        kind = kinds[0] if len(kinds) == 1 else rng.choice(kinds)
+        yield SpawnEvent(tick, kind, x)
+
+
+def _tick(event):
+    return event.tick
+
+
+# Events stay in `buffer` after they are handed out; `next` is the cursor into it, so
+# seek() can move a stream back for a rollback without generating anything again.
+class SpawnStream:
+    def __init__(self, seed, pattern, lookahead=600, precompute=3600):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.pattern = pattern
+        self.lookahead = lookahead
+        self.events = spawn_events(seed, pattern)
+        self.buffer = []
+        self.next = 0
+        self.horizon = 0
+        self.precompute(precompute)
+
+    # Generates everything up to `tick` ahead of time, e.g. while loading, so the
+    # hot loop only hands out ready-made events.
+    def precompute(self, tick):
+        buffer = self.buffer
+        events = self.events
+        while self.horizon < tick:
+            event = next(events)
+            buffer.append(event)
+            self.horizon = event.tick
+
+    def due(self, tick):
+        # At least one event past `tick` stays generated, so the scan below always stops.
+        if self.horizon <= tick + self.lookahead:
+            self.precompute(tick + self.lookahead + 1)
+        buffer = self.buffer
+        start = end = self.next
+        if buffer[start].tick > tick:
+            return ()
+        while buffer[end].tick <= tick:
+            end += 1
+        self.next = end
+        return buffer[start:end]
+
+    # Puts the cursor where it is after the events due by `tick` were handed out,
+    # backwards or forwards.
+    def seek(self, tick):
+        self.precompute(tick + self.lookahead)
+        self.next = bisect_right(self.buffer, tick, key=_tick)
+
+    def chunk(self, start, end):
+        self.precompute(end)
+        return self.buffer[bisect_left(self.buffer, start, key=_tick):bisect_left(self.buffer, end, key=_tick)]
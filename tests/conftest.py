@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Everything runs headless, and nothing a test plays is a new high score.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ["SCORES_DB"] = "off"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,10 @@
+import pytest
+
+import batch_sim
+import headless
+
+
+@pytest.mark.parametrize("name", ("main", "makeshift2"))
+def test_batch_matches_runner_sim(name):
+    game = headless.load_game(name)
+    assert batch_sim.check_parity(game, 50, 1500, seed=7) is None
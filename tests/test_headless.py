@@ -0,0 +1,22 @@
+import pytest
+
+import headless
+from controls import RandomInput, ScriptedInput
+
+
+@pytest.mark.parametrize("name", sorted(headless.GAMES))
+def test_same_seed_and_inputs_give_the_same_run(name):
+    game = headless.load_game(name)
+    first = headless.simulate(game, RandomInput(3), 3000, seed=3)
+    second = headless.simulate(game, RandomInput(3), 3000, seed=3)
+    for result in (first, second):
+        del result["seconds"], result["ticks_per_ms"]
+    assert first == second
+    assert first["ticks"] > 0
+
+
+def test_idle_run_ends():
+    game = headless.load_game("makeshift2")
+    result = headless.simulate(game, ScriptedInput([]), 100_000, seed=0)
+    assert result["over"]
+    assert result["ticks"] < 100_000
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+import time
+
+import leaderboard
+
+
+def stored(path, game):
+    db = leaderboard.connect_readonly(path)
+    try:
+        return [row[0] for row in db.execute(leaderboard.TOP, (game, 10))]
+    finally:
+        db.close()
+
+
+# Waits for the writer thread to print `text`, returning everything printed so far.
+def wait_for(capsys, text, timeout=5):
+    out = ""
+    deadline = time.monotonic() + timeout
+    while text not in out and time.monotonic() < deadline:
+        out += capsys.readouterr().out
+        time.sleep(0.01)
+    return out
+
+
+def test_scores_wait_for_a_database_that_opens_late(tmp_path, monkeypatch):
+    path = str(tmp_path / "scores.db")
+    failures = []
+    failed = threading.Event()
+    connect = leaderboard.connect
+
+    # The writer opens the database when it starts and again for the first batch.
+    def locked(path):
+        if len(failures) < 2:
+            failures.append(path)
+            if len(failures) == 2:
+                failed.set()
+            raise sqlite3.OperationalError("database is locked")
+        return connect(path)
+
+    monkeypatch.setattr(leaderboard, "connect", locked)
+    board = leaderboard.Leaderboard(path, "test")
+    board.submit(5)
+    assert failed.wait(5)
+    assert board.thread.is_alive()
+    assert [entry[0] for entry in board.top()] == [5]
+
+    board.submit(7)
+    board.close()
+    assert board.written == 2
+    assert stored(path, "test") == [7, 5]
+
+
+def test_writer_survives_a_failing_write(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "scores.db")
+    board = leaderboard.Leaderboard(path, "test")
+    monkeypatch.setattr(leaderboard, "INSERT", "INSERT INTO missing VALUES (?, ?, ?, ?, ?)")
+    board.submit(3)
+    assert "can't save 1 scores" in wait_for(capsys, "can't save")
+    assert board.thread.is_alive()
+
+    monkeypatch.undo()
+    board.submit(4)
+    board.close()
+    assert board.written == 2
+    assert stored(path, "test") == [4, 3]
@@ -0,0 +1,109 @@
+import socket
+
+import pytest
+
+import headless
+import race
+from controls import RandomInput
+
+
+# Stands in for asyncio's transport on the server's end of a socketpair.
+class Transport:
+    def __init__(self, sock):
+        self.sock = sock
+        self.aborted = False
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def get_extra_info(self, name):
+        return None
+
+    def abort(self):
+        self.aborted = True
+
+
+# A Unix socketpair has no TCP options to set.
+class ClientSocket:
+    def __init__(self, sock):
+        self.sock = sock
+
+    def setsockopt(self, *args):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+class Link:
+    def __init__(self, monkeypatch, server):
+        client_end, self.server_end = socket.socketpair()
+        self.server_end.setblocking(False)
+        monkeypatch.setattr(race.socket, "create_connection", lambda address: ClientSocket(client_end))
+        self.transport = Transport(self.server_end)
+        self.connection = race.RaceConnection(server)
+        self.connection.connection_made(self.transport)
+
+    # Hands whatever the client sent to the server's protocol.
+    def pump(self):
+        while True:
+            try:
+                data = self.server_end.recv(65536)
+            except BlockingIOError:
+                return
+            self.connection.data_received(data)
+
+
+@pytest.fixture
+def game():
+    return headless.load_game("main")
+
+
+def test_prediction_matches_the_server(monkeypatch, game):
+    server = race.RaceServer(game.new_run, race_size=1, seed=1)
+    link = Link(monkeypatch, server)
+    client = race.RaceClient(("test", 0), game.new_run)
+    link.pump()
+    inputs = RandomInput(5, jump=0.08, jetpack=0.003)
+    checked = {}
+    for _ in range(5000):
+        server.tick()
+        client.poll()
+        if client.started and not client.run.over:
+            for _ in range(client.steps(1)):
+                client.step(inputs.read())
+                if client.run.over:
+                    break
+        link.pump()
+        for tick, state in client.confirmed.items():
+            if tick in client.predicted:
+                checked[tick] = client.predicted[tick] == state[:-1]
+        if client.results is not None:
+            break
+
+    assert client.results is not None
+    assert len(checked) > 300
+    assert all(checked.values())
+    assert client.corrections == 0
+
+
+def test_server_drops_a_malformed_message(monkeypatch, game):
+    server = race.RaceServer(game.new_run, race_size=1)
+    link = Link(monkeypatch, server)
+    client = race.RaceClient(("test", 0), game.new_run)
+    client._send(bytes([race.MSG_INPUT, 1]))
+    link.pump()
+    assert link.transport.aborted
+    assert server.malformed == 1
+
+
+def test_client_leaves_on_a_malformed_message(monkeypatch, game):
+    server = race.RaceServer(game.new_run, race_size=1)
+    link = Link(monkeypatch, server)
+    client = race.RaceClient(("test", 0), game.new_run)
+    link.transport.write(race.frame(bytes([race.MSG_STATE])))
+    client.poll()
+    assert not client.connected
@@ -0,0 +1,25 @@
+import pytest
+
+import headless
+import replay
+from controls import RandomInput
+
+
+@pytest.mark.parametrize("name", sorted(headless.GAMES))
+def test_seek_restores_the_recorded_run(name, tmp_path):
+    game = headless.load_game(name)
+    run = game.new_run(11)
+    recorder = replay.Recorder(run, name, tmp_path / "run.replay", snapshot_every=300)
+    inputs = recorder.wrap(RandomInput(11))
+    states = {}
+    while not run.over and run.ticks < 5000:
+        run.step(inputs.read())
+        if run.ticks % 250 == 0:
+            states[run.ticks] = replay.snapshot(run)
+    states[run.ticks] = replay.snapshot(run)
+    recorder.save()
+
+    recorded = replay.Replay.load(tmp_path / "run.replay")
+    assert recorded.final == {"score": run.score, "health": run.player.health, "over": run.over}
+    for tick, state in states.items():
+        assert replay.snapshot(replay.seek(game, recorded, tick)) == state
@@ -0,0 +1,28 @@
+import headless
+from spawns import SpawnStream
+
+
+def pattern():
+    return headless.load_game("jurassic").PATTERN
+
+
+def events(stream, ticks):
+    return [event for tick in range(1, ticks + 1) for event in stream.due(tick)]
+
+
+def test_same_seed_gives_the_same_course():
+    first = events(SpawnStream(42, pattern()), 20_000)
+    assert first == events(SpawnStream(42, pattern()), 20_000)
+    assert first != events(SpawnStream(43, pattern()), 20_000)
+
+
+def test_course_does_not_depend_on_precompute():
+    assert events(SpawnStream(5, pattern(), precompute=0), 5000) == events(SpawnStream(5, pattern()), 5000)
+
+
+def test_seek_replays_the_same_events():
+    stream = SpawnStream(9, pattern())
+    before = events(stream, 3000)
+    stream.seek(1000)
+    after = [event for tick in range(1001, 3001) for event in stream.due(tick)]
+    assert after == [event for event in before if event.tick > 1000]
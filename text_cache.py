@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class FontRegistry:
+    def __init__(self):
+        self.fonts = {}
+
+    def get(self, path, size):
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.Font(path, size)
+            self.fonts[key] = font
+        return font
+
+    def sys(self, name, size):
+        key = ("sys:" + name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(name, size)
+            self.fonts[key] = font
+        return font
+
+
+class TextCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Fonts are keyed by identity, so pass fonts from the registry rather than fresh ones.
+    def render(self, text, color, font, antialias=True):
+        key = (text, color, font, antialias)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.reset_stats()
+
+
+fonts = FontRegistry()
+texts = TextCache()
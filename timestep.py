@@ -0,0 +1,51 @@
+from options import option
+
+
+# --fps=144 on the command line wins over the DISPLAY_FPS environment variable; 0 means uncapped.
+def display_fps(argv=None, default=60):
+    return int(option("fps", "DISPLAY_FPS", argv, default))
+
+
+class FixedTimestep:
+    # Benchmarks set this to feed every advance() the same dt, so each frame runs
+    # exactly one tick no matter how fast frames are actually produced.
+    dt_override = None
+
+    def __init__(self, step=1 / 60, max_steps=5):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+    # Returns how many simulation ticks to run for dt seconds of real time. After a
+    # long stall the backlog is dropped instead of trying to catch up all at once.
+    def advance(self, dt):
+        if self.dt_override is not None:
+            dt = self.dt_override
+        self.accumulator += dt
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    # How far the display is between the last two ticks, for interpolation.
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.step, 1.0)
+
+
+class Interpolated:
+    __slots__ = ()
+    prev_pos = None
+
+    def snapshot(self):
+        self.prev_pos = self.rect.topleft
+
+    def lerp_pos(self, alpha=1.0):
+        if self.prev_pos is None or alpha >= 1.0:
+            return self.rect.topleft
+        px, py = self.prev_pos
+        x, y = self.rect.topleft
+        return (round(px + (x - px) * alpha), round(py + (y - py) * alpha))